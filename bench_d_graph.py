@@ -0,0 +1,60 @@
+# Course: CS261 - Data Structures
+# Author: Kyle Brogdon
+# Assignment: Assignment 6 Directed Graphs
+# Description: Benchmark of point-to-point queries on DirectedGraph, plain dijkstra() against the landmark (ALT)
+# index. Usage: python bench_d_graph.py [grid side] [queries] [landmarks]
+
+import random
+import sys
+import time
+
+from d_graph import DirectedGraph
+
+
+def grid_graph(side: int, seed=261) -> DirectedGraph:
+    """
+    Takes a side length and returns a road-like side x side grid with random weights in both directions
+    """
+    rng = random.Random(seed)
+    edges = []
+    for r in range(side):
+        for c in range(side):
+            v = r * side + c
+            if c + 1 < side:
+                edges.append((v, v + 1, rng.randint(1, 20)))
+                edges.append((v + 1, v, rng.randint(1, 20)))
+            if r + 1 < side:
+                edges.append((v, v + side, rng.randint(1, 20)))
+                edges.append((v + side, v, rng.randint(1, 20)))
+    g = DirectedGraph(edges)
+    g.set_storage('csr')
+    return g
+
+
+if __name__ == '__main__':
+    side = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    g = grid_graph(side)
+    rng = random.Random(7)
+    queries = [(rng.randrange(g.v_count), rng.randrange(g.v_count)) for _ in range(count)]
+    print(f'{g.v_count} vertices, {len(g.get_edges())} edges, {count} queries')
+
+    start = time.perf_counter()
+    expected = [g.dijkstra(src)[dst] for src, dst in queries]
+    plain = time.perf_counter() - start
+    print(f'dijkstra():           {plain * 1000 / count:8.2f} ms/query')
+
+    start = time.perf_counter()
+    g.build_landmark_index(k)
+    build = time.perf_counter() - start
+    print(f'landmark index build: {build * 1000:8.2f} ms ({k} landmarks)')
+
+    start = time.perf_counter()
+    results = [g.shortest_path(src, dst)[0] for src, dst in queries]
+    alt = time.perf_counter() - start
+    print(f'shortest_path() ALT:  {alt * 1000 / count:8.2f} ms/query')
+
+    assert results == expected, 'ALT distances differ from dijkstra()'
+    print(f'speedup: {plain / alt:.1f}x')
@@ -3,8 +3,753 @@
 # Assignment: Assignment 6 Directed Graphs
 # Description:
 
+import copy
 import heapq
+import math
+import os
+import struct
+from array import array
+from bisect import bisect_left, insort
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from graph_bfs import level_bfs
+from graph_io import (FLOAT_WEIGHTS, atomic_write, edge_format, iter_text_edges, open_buffer, padding,
+                      read_edge_columns, take_column)
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only the vectorized code paths need it
+    np = None
+
+
+def _typecode(column) -> str:
+    """
+    Returns the item type code of an array or a typed memoryview
+    """
+    return column.typecode if isinstance(column, array) else column.format
+
+
+def _own_row(table, owned, i):
+    """
+    Returns table[i] ready to be edited. While the table is shared with a snapshot, owned is the set of rows already
+    copied since the snapshot was taken, and any other row is replaced by a copy (and recorded) before it is returned
+    """
+    if owned is not None and i not in owned:
+        table[i] = copy.copy(table[i])
+        owned.add(i)
+    return table[i]
+
+
+def _weight_array(weights: []):
+    """
+    Takes a list of edge weights and packs it into a compact array, 64 bit integers when every weight is an integer
+    and doubles when every weight is a float. Mixed weights stay in the list, so each one keeps its own type
+    """
+    try:
+        return array('q', weights)
+    except (TypeError, OverflowError):
+        if all(type(w) is float for w in weights):
+            return array('d', weights)
+        return weights
+
+
+class _DenseStorage:
+    """
+    Storage backend built on the adjacency matrix. Alongside the matrix it keeps a sorted list of the successors of
+    each vertex so neighbor scans only touch edges that exist
+    """
+    kind = 'dense'
+    owned = None  # (matrix rows, successor lists, predecessor lists) copied since the last unshare(), None if all are
+
+    def __init__(self, matrix: []):
+        """
+        Takes an existing adjacency matrix (shared, not copied) and indexes the edges already stored in it
+        """
+        self.matrix = matrix
+        self.out_lists = []
+        self.in_lists = [[] for _ in range(len(matrix))]
+        self.edge_count = 0
+        for u in range(len(matrix)):  # index any edges that were stored before the backend existed
+            targets = [v for v in range(len(matrix[u])) if matrix[u][v] > 0]
+            self.out_lists.append(targets)
+            for v in targets:
+                self.in_lists[v].append(u)
+            self.edge_count += len(targets)
+
+    def add_vertex(self) -> None:
+        """
+        Grows every row by one column and appends a new empty row
+        """
+        for u in range(len(self.matrix)):
+            _own_row(self.matrix, self.owned and self.owned[0], u).append(0)
+        self.matrix.append([0] * (len(self.matrix) + 1))
+        self.out_lists.append([])
+        self.in_lists.append([])
+
+    def weight(self, u: int, v: int):
+        """
+        Returns the weight stored for the edge u -> v, 0 if there is no edge
+        """
+        return self.matrix[u][v]
+
+    def set_weight(self, u: int, v: int, weight) -> None:
+        """
+        Stores the weight of the edge u -> v, a weight of 0 removes the edge
+        """
+        owned = self.owned or (None, None, None)
+        old = self.matrix[u][v]
+        _own_row(self.matrix, owned[0], u)[v] = weight
+        if old <= 0 < weight:  # new edge, keep the successor and predecessor lists sorted
+            insort(_own_row(self.out_lists, owned[1], u), v)
+            insort(_own_row(self.in_lists, owned[2], v), u)
+            self.edge_count += 1
+        elif weight <= 0 < old:  # removed edge
+            targets = _own_row(self.out_lists, owned[1], u)
+            del targets[bisect_left(targets, v)]
+            sources = _own_row(self.in_lists, owned[2], v)
+            del sources[bisect_left(sources, u)]
+            self.edge_count -= 1
+
+    def unshare(self) -> None:
+        """
+        Called before the first edit after a snapshot took a copy of this backend. Only the outer lists are copied,
+        each row is copied the first time it is edited
+        """
+        self.matrix = list(self.matrix)
+        self.out_lists = list(self.out_lists)
+        self.in_lists = list(self.in_lists)
+        self.owned = set(), set(), set()
+
+    def successors(self, u: int) -> []:
+        """
+        Returns a list of (vertex, weight) tuples for the edges leaving u, in ascending vertex order
+        """
+        row = self.matrix[u]
+        return [(v, row[v]) for v in self.out_lists[u]]
+
+    def predecessors(self, v: int) -> []:
+        """
+        Returns a list of (vertex, weight) tuples for the edges entering v, in ascending vertex order
+        """
+        matrix = self.matrix
+        return [(u, matrix[u][v]) for u in self.in_lists[v]]
+
+
+class _CSRStorage:
+    """
+    Compressed sparse row storage backend. The edges of vertex u are targets[offsets[u]:offsets[u + 1]] (sorted) with
+    the matching weights, so memory is proportional to V + E. The weights are a plain list when integer and float
+    weights are mixed. Mutations go to a small delta buffer of {u: {v: weight}} overrides which is folded back into
+    the arrays once it grows large. The reverse (incoming edge) arrays are only built the first time predecessors are
+    asked for
+    """
+    kind = 'csr'
+    min_delta = 1024  # the delta buffer is compacted once it holds more than max(min_delta, E // 4) overrides
+    owned = None  # (delta rows, delta_in rows) copied since the last unshare(), None if all are
+
+    def __init__(self, n: int, offsets, targets, weights):
+        """
+        Takes the number of vertices and the three CSR arrays (any indexable buffer, e.g. array or memoryview)
+        """
+        self.n = n  # vertices at or past len(offsets) - 1 were added after the arrays were built
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.delta = dict()
+        self.delta_in = dict()  # the same overrides keyed by the destination vertex
+        self.delta_size = 0
+        self.edge_count = len(targets)
+        self.in_offsets = None  # reverse arrays, see _build_reverse()
+        self.in_sources = None
+        self.in_edges = None
+
+    @classmethod
+    def from_storage(cls, storage, n: int):
+        """
+        Takes any storage backend and the number of vertices and builds packed CSR arrays from its edges
+        """
+        offsets = array('q', [0])
+        targets = array('q')
+        weights = []
+        for u in range(n):
+            for v, w in storage.successors(u):
+                targets.append(v)
+                weights.append(w)
+            offsets.append(len(targets))
+        return cls(n, offsets, targets, _weight_array(weights))
+
+    def _base_row(self, u: int):
+        """
+        Returns the (start, end) slice bounds of u in the packed arrays
+        """
+        if u < len(self.offsets) - 1:
+            return self.offsets[u], self.offsets[u + 1]
+        return 0, 0
+
+    def add_vertex(self) -> None:
+        """
+        Adds a vertex with no edges, which only needs the vertex count to grow
+        """
+        self.n += 1
+
+    def weight(self, u: int, v: int):
+        """
+        Returns the weight stored for the edge u -> v, 0 if there is no edge
+        """
+        if not 0 <= u < self.n or not 0 <= v < self.n:
+            raise IndexError('vertex index out of range')
+        changes = self.delta.get(u)
+        if changes is not None and v in changes:
+            return changes[v]
+        start, end = self._base_row(u)
+        i = bisect_left(self.targets, v, start, end)  # rows are sorted so a binary search finds the edge
+        if i < end and self.targets[i] == v:
+            return self.weights[i]
+        return 0
+
+    def set_weight(self, u: int, v: int, weight) -> None:
+        """
+        Records the new weight of the edge u -> v in the delta buffer, a weight of 0 removes the edge
+        """
+        old = self.weight(u, v)
+        if old <= 0 and weight <= 0:  # removing an edge that does not exist
+            return
+        if old <= 0 < weight:
+            self.edge_count += 1
+        elif weight <= 0 < old:
+            self.edge_count -= 1
+        owned = self.owned or (None, None)
+        changes = _own_row(self.delta, owned[0], u) if u in self.delta else self.delta.setdefault(u, dict())
+        if v not in changes:
+            self.delta_size += 1
+        changes[v] = weight if weight > 0 else 0
+        sources = _own_row(self.delta_in, owned[1], v) if v in self.delta_in else self.delta_in.setdefault(v, dict())
+        sources[u] = changes[v]
+        if self.delta_size > max(self.min_delta, self.edge_count // 4):
+            self.compact()
+
+    def successors(self, u: int) -> []:
+        """
+        Returns a list of (vertex, weight) tuples for the edges leaving u, in ascending vertex order
+        """
+        start, end = self._base_row(u)
+        row = zip(self.targets[start:end], self.weights[start:end])
+        changes = self.delta.get(u)
+        if not changes:
+            return list(row)
+        merged = dict(row)  # only rows touched since the last compaction pay for the merge
+        merged.update(changes)
+        return sorted(item for item in merged.items() if item[1] > 0)
+
+    def _build_reverse(self) -> None:
+        """
+        Builds the incoming edge arrays from the packed arrays with a counting sort, in_edges holds the index of each
+        edge in the forward arrays so its weight is shared. The arrays are filled locally and in_offsets is published
+        last, so threads reading a snapshot never see a half built reverse index
+        """
+        offsets, targets = self.offsets, self.targets
+        base_n = len(offsets) - 1
+        counts = array('q', [0]) * (base_n + 1)
+        for v in targets:
+            counts[v + 1] += 1
+        for v in range(base_n):  # prefix sums turn counts into row offsets
+            counts[v + 1] += counts[v]
+        fill = array('q', counts)
+        in_sources = array('q', [0]) * len(targets)
+        in_edges = array('q', [0]) * len(targets)
+        for u in range(base_n):  # sources are visited in ascending order so every reverse row comes out sorted
+            for i in range(offsets[u], offsets[u + 1]):
+                v = targets[i]
+                in_sources[fill[v]] = u
+                in_edges[fill[v]] = i
+                fill[v] += 1
+        self.in_sources, self.in_edges = in_sources, in_edges
+        self.in_offsets = counts
+
+    def predecessors(self, v: int) -> []:
+        """
+        Returns a list of (vertex, weight) tuples for the edges entering v, in ascending vertex order
+        """
+        if self.in_offsets is None:
+            self._build_reverse()
+        row = []
+        if v < len(self.in_offsets) - 1:
+            for i in range(self.in_offsets[v], self.in_offsets[v + 1]):
+                row.append((self.in_sources[i], self.weights[self.in_edges[i]]))
+        changes = self.delta_in.get(v)
+        if not changes:
+            return row
+        merged = dict(row)
+        merged.update(changes)
+        return sorted(item for item in merged.items() if item[1] > 0)
+
+    def compact(self) -> None:
+        """
+        Folds the delta buffer back into freshly packed arrays
+        """
+        packed = _CSRStorage.from_storage(self, self.n)
+        self.offsets, self.targets, self.weights = packed.offsets, packed.targets, packed.weights
+        self.delta = dict()
+        self.delta_in = dict()
+        self.owned = None  # the new buffers belong to this backend alone
+        self.delta_size = 0
+        self.edge_count = len(self.targets)
+        self.in_offsets = self.in_sources = self.in_edges = None  # rebuilt on the next predecessors() call
+
+    def unshare(self) -> None:
+        """
+        Called before the first edit after a snapshot took a copy of this backend. The packed arrays are never
+        written in place, so only the outer delta dicts are copied, each delta row is copied the first time it is
+        edited
+        """
+        self.delta = dict(self.delta)
+        self.delta_in = dict(self.delta_in)
+        self.owned = set(), set()
+
+
+class _NumpyStorage:
+    """
+    Storage backend holding the adjacency matrix as a numpy array, int64 while every weight is an integer and float64
+    once a float weight is stored. The matrix is the top left n x n corner of a larger buffer that grows by a quarter
+    at a time, so add_vertex does not copy the whole matrix every call. Neighbor scans are one vectorized pass over a
+    row or column, and the bulk queries of DirectedGraph run directly on the array
+    """
+    kind = 'numpy'
+
+    def __init__(self, buffer, n: int):
+        """
+        Takes a square numpy buffer (used as is) and the number of vertices stored in its top left corner
+        """
+        self.buffer = buffer
+        self.n = n
+        self.edge_count = int(np.count_nonzero(self.matrix > 0))
+
+    @classmethod
+    def from_packed(cls, packed, n: int):
+        """
+        Takes a CSR backend with no pending delta and the number of vertices and scatters its edges into a new matrix
+        """
+        weights = np.asarray(packed.weights)
+        buffer = np.zeros((n, n), dtype=np.float64 if weights.dtype.kind == 'f' else np.int64)
+        offsets = np.asarray(packed.offsets, dtype=np.int64)
+        sources = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        buffer[sources, np.asarray(packed.targets, dtype=np.int64)] = weights
+        return cls(buffer, n)
+
+    @property
+    def matrix(self):
+        """
+        Returns the n x n view of the buffer that holds the edges
+        """
+        return self.buffer[:self.n, :self.n]
+
+    def add_vertex(self) -> None:
+        """
+        Adds a vertex with no edges, moving the matrix to a larger buffer when the current one is full
+        """
+        if self.n == len(self.buffer):
+            capacity = self.n + max(16, self.n // 4)
+            buffer = np.zeros((capacity, capacity), dtype=self.buffer.dtype)
+            buffer[:self.n, :self.n] = self.matrix
+            self.buffer = buffer
+        self.n += 1
+
+    def weight(self, u: int, v: int):
+        """
+        Returns the weight stored for the edge u -> v, 0 if there is no edge
+        """
+        if not 0 <= u < self.n or not 0 <= v < self.n:
+            raise IndexError('vertex index out of range')
+        return self.buffer[u, v].item()
+
+    def set_weight(self, u: int, v: int, weight) -> None:
+        """
+        Stores the weight of the edge u -> v, a weight of 0 or less removes the edge
+        """
+        if weight <= 0:
+            weight = 0
+        elif self.buffer.dtype.kind != 'f' and not isinstance(weight, (int, np.integer)):
+            self.buffer = self.buffer.astype(np.float64)  # the first float weight switches the whole matrix
+        old = self.buffer[u, v]
+        self.buffer[u, v] = weight
+        self.edge_count += int(weight > 0) - int(old > 0)
+
+    def set_weights(self, sources, targets, weights) -> None:
+        """
+        Takes parallel numpy arrays of valid, distinct (source, target) pairs and their weights and stores them all
+        at once, a weight of 0 or less removes the edge. An integer matrix only switches to float64 when a stored
+        weight has a fractional part, a float array of whole numbers (or of removals) is stored as integers
+        """
+        if len(weights) == 0:
+            return
+        weights = np.where(weights > 0, weights, 0)
+        if weights.dtype.kind == 'f' and self.buffer.dtype.kind != 'f':
+            if np.any(np.mod(weights, 1) != 0):  # nan and inf count as fractional too
+                self.buffer = self.buffer.astype(np.float64)
+            else:
+                weights = weights.astype(np.int64)
+        old = self.buffer[sources, targets]
+        self.buffer[sources, targets] = weights
+        self.edge_count += int(np.count_nonzero(weights > 0)) - int(np.count_nonzero(old > 0))
+
+    def unshare(self) -> None:
+        """
+        Called before the first edit after a snapshot took a copy of this backend. The rows of a numpy matrix cannot
+        be shared one by one, so the writer takes a copy of the whole buffer
+        """
+        self.buffer = self.buffer.copy()
+
+    def successors(self, u: int) -> []:
+        """
+        Returns a list of (vertex, weight) tuples for the edges leaving u, in ascending vertex order
+        """
+        row = self.buffer[u, :self.n]
+        found = np.flatnonzero(row > 0)
+        return list(zip(found.tolist(), row[found].tolist()))
+
+    def predecessors(self, v: int) -> []:
+        """
+        Returns a list of (vertex, weight) tuples for the edges entering v, in ascending vertex order
+        """
+        column = self.buffer[:self.n, v]
+        found = np.flatnonzero(column > 0)
+        return list(zip(found.tolist(), column[found].tolist()))
+
+    def edge_arrays(self) -> ():
+        """
+        Returns (sources, targets, weights) numpy arrays of every edge, ordered by source and then target
+        """
+        matrix = self.matrix
+        sources, targets = np.nonzero(matrix > 0)
+        return sources, targets, matrix[sources, targets]
+
+    def packed(self):
+        """
+        Returns the edges as a new CSR backend
+        """
+        sources, targets, weights = self.edge_arrays()
+        offsets = array('q')
+        offsets.frombytes(np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=self.n)))).astype(np.int64)
+                          .tobytes())
+        packed_targets = array('q')
+        packed_targets.frombytes(targets.astype(np.int64).tobytes())
+        packed_weights = array('d' if weights.dtype.kind == 'f' else 'q')
+        packed_weights.frombytes(weights.tobytes())
+        return _CSRStorage(self.n, offsets, packed_targets, packed_weights)
+
+
+class _MatrixView:
+    """
+    Read-only stand-in for adj_matrix while the graph uses csr or numpy storage, each row is built as a list when it is
+    accessed
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def __len__(self) -> int:
+        return self.storage.n
+
+    def __getitem__(self, u: int) -> []:
+        u = range(self.storage.n)[u]  # normalizes negative indices and raises IndexError when out of range
+        row = [0] * self.storage.n
+        for v, w in self.storage.successors(u):
+            row[v] = w
+        return row
+
+    def __iter__(self):
+        for u in range(self.storage.n):
+            yield self[u]
+
+
+def _csr_from_columns_numpy(n: int, sources, destinations, weights):
+    """
+    numpy version of the packing loop in DirectedGraph._from_columns(): one stable sort by (source, destination,
+    input position), then vectorized masks drop loops, negative vertices, overwritten duplicates and non-positive
+    weights
+    """
+    src = np.asarray(sources, dtype=np.int64)
+    dst = np.asarray(destinations, dtype=np.int64)
+    wts = np.asarray(weights)
+    keep = (src != dst) & (src >= 0) & (dst >= 0)
+    position = np.nonzero(keep)[0]
+    order = position[np.lexsort((position, dst[position], src[position]))]
+    src, dst, wts = src[order], dst[order], wts[order]
+    last = np.ones(len(src), dtype=bool)  # the last copy of each (src, dst) pair holds its final weight
+    last[:-1] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+    last &= wts > 0
+    src, dst, wts = src[last], dst[last], wts[last]
+    offsets = array('q')
+    offsets.frombytes(np.concatenate(([0], np.cumsum(np.bincount(src, minlength=n)))).astype(np.int64).tobytes())
+    targets = array('q')
+    targets.frombytes(dst.tobytes())
+    packed_weights = array('d' if wts.dtype.kind == 'f' else 'q')
+    packed_weights.frombytes(wts.astype(np.float64 if wts.dtype.kind == 'f' else np.int64).tobytes())
+    return _CSRStorage(n, offsets, targets, packed_weights)
+
+
+class LandmarkIndex:
+    """
+    Landmark (ALT) distance index for a DirectedGraph. For each of k landmark vertices it stores the distance from
+    the landmark to every vertex and from every vertex to the landmark, which the triangle inequality turns into lower
+    bounds on the distance between any two vertices. Attached to a graph, it tracks add_edge / remove_edge calls and
+    only recomputes the landmark rows an edit can have changed
+    """
+    magic = b'DGLM'
+    version = 1
+
+    def __init__(self, landmarks: [], forward: [], backward: []):
+        """
+        Takes the landmark vertices and, for each of them, an array of distances from it (forward) and to it
+        (backward) indexed by vertex
+        """
+        self.landmarks = landmarks
+        self.forward = forward
+        self.backward = backward
+        self.graph = None  # set while the index is attached, see DirectedGraph.set_landmark_index()
+        self.dirty = set()  # (row, 0 for forward or 1 for backward) pairs that need to be recomputed
+
+    @classmethod
+    def build(cls, graph, k=8):
+        """
+        Takes a graph and a number of landmarks and builds an index. Landmarks are picked farthest first: each new
+        landmark is the vertex farthest from the ones already picked, preferring vertices none of them reach
+        """
+        landmarks = []
+        forward = []
+        backward = []
+        closest = [float('inf')] * graph.v_count  # distance from the nearest landmark picked so far
+        vertices = graph.get_vertices()  # removed vertices are never landmarks
+        candidate = vertices[0] if len(vertices) > 0 else -1
+        for _ in range(min(k, len(vertices))):
+            landmarks.append(candidate)
+            forward.append(array('d', graph._distances(candidate, reverse=False)))
+            backward.append(array('d', graph._distances(candidate, reverse=True)))
+            for v in range(graph.v_count):
+                closest[v] = min(closest[v], forward[-1][v])
+            candidate = -1
+            for v in vertices:
+                if v not in landmarks and (candidate == -1 or closest[v] > closest[candidate]):
+                    candidate = v
+        return cls(landmarks, forward, backward)
+
+    def lower_bound(self, v: int, dst: int):
+        """
+        Returns a lower bound on the distance from v to dst, inf when the landmarks prove dst cannot be reached
+        """
+        self._refresh()
+        inf = float('inf')
+        bound = 0
+        for i in range(len(self.landmarks)):
+            forward, backward = self.forward[i], self.backward[i]
+            if forward[v] != inf:  # d(L, dst) <= d(L, v) + d(v, dst)
+                if forward[dst] == inf:  # L reaches v but not dst, so v cannot reach dst either
+                    return inf
+                bound = max(bound, forward[dst] - forward[v])
+            if backward[dst] != inf:  # d(v, L) <= d(v, dst) + d(dst, L)
+                if backward[v] == inf:  # dst reaches L but v does not, so v cannot reach dst
+                    return inf
+                bound = max(bound, backward[v] - backward[dst])
+        return bound
+
+    def heuristic(self, dst: int):
+        """
+        Returns a function of one vertex giving its lower bound to dst, for DirectedGraph.shortest_path()
+        """
+        self._refresh()
+        return lambda v: self.lower_bound(v, dst)
+
+    def edge_changed(self, src: int, dst: int, old, new) -> None:
+        """
+        Called by the attached graph when the weight of src -> dst goes from old to new (0 meaning no edge). Marks the
+        landmark rows the change can affect: a new or cheaper edge that shortens a stored distance, or a removed or
+        more expensive edge that a stored shortest path ran through
+        """
+        old = old if old > 0 else 0
+        new = new if new > 0 else 0
+        grew = old > 0 and (new == 0 or new > old)
+        for i in range(len(self.landmarks)):
+            forward, backward = self.forward[i], self.backward[i]
+            if new > 0 and forward[src] + new < forward[dst] or grew and forward[src] + old <= forward[dst]:
+                self.dirty.add((i, 0))
+            if new > 0 and backward[dst] + new < backward[src] or grew and backward[dst] + old <= backward[src]:
+                self.dirty.add((i, 1))
+
+    def vertex_added(self) -> None:
+        """
+        Called by the attached graph after add_vertex(), a vertex without edges is unreachable both ways
+        """
+        for i in range(len(self.landmarks)):
+            self.forward[i].append(float('inf'))
+            self.backward[i].append(float('inf'))
+
+    def _refresh(self) -> None:
+        """
+        Recomputes the rows marked dirty since the last query
+        """
+        if len(self.dirty) == 0:
+            return
+        for i, reverse in self.dirty:
+            row = array('d', self.graph._distances(self.landmarks[i], reverse == 1))
+            if reverse == 1:
+                self.backward[i] = row
+            else:
+                self.forward[i] = row
+        self.dirty = set()
+
+    def save(self, path: str) -> None:
+        """
+        Writes the index to a binary file: a header (magic, version, vertex count, landmark count), the landmark
+        vertices as 64 bit integers, then the forward and backward distance rows as doubles
+        """
+        self._refresh()
+        n = len(self.forward[0]) if len(self.landmarks) > 0 else 0
+        with atomic_write(path) as f:
+            f.write(struct.pack('<4sIqq', self.magic, self.version, n, len(self.landmarks)))
+            array('q', self.landmarks).tofile(f)
+            for row in self.forward + self.backward:
+                row.tofile(f)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Reads an index written by save()
+        """
+        with open(path, 'rb') as f:
+            magic, version, n, k = struct.unpack('<4sIqq', f.read(struct.calcsize('<4sIqq')))
+            if magic != cls.magic or version != cls.version:
+                raise ValueError(f'{path} is not a version {cls.version} landmark index')
+            landmarks = array('q')
+            landmarks.fromfile(f, k)
+            rows = []
+            for _ in range(2 * k):
+                row = array('d')
+                row.fromfile(f, n)
+                rows.append(row)
+        return cls(list(landmarks), rows[:k], rows[k:])
+
+
+class _ReachabilityIndex:
+    """
+    Interval labels over the strongly connected components of a DirectedGraph (GRAIL style), O(V + E) to build and
+    O(labelings * V) to keep. Depth first searches of the condensation number the components in post order, and for
+    each component c the index keeps
+    - post[c] and low[c] (the smallest post number c reaches) per search: c can only reach d when the range of d
+      lies inside the range of c, so one range outside proves there is no path
+    - first[c], the first post number of the subtree of c in the first search: a post number of d in
+      first[c]..post[c] means d is a tree descendant of c, which proves there is a path
+    Queries neither test settles search the condensation, pruned by the same ranges and by the topological order
+    """
+    labelings = 2  # independent searches (children in ascending, then descending order), more prune more false hits
+
+    def __init__(self, graph):
+        """
+        Takes a graph and labels its condensation, components coming from _scc() in topological order
+        """
+        components, self.component = graph._scc()
+        store = graph._store()
+        count = len(components)
+        self.dag = [sorted({self.component[v] for u in members for v, _ in store.successors(u)} - {c})
+                    for c, members in enumerate(components)]
+        self.post = [array('q', [0]) * count for _ in range(self.labelings)]
+        self.low = [array('q', [0]) * count for _ in range(self.labelings)]
+        self.first = array('q', [0]) * count
+        for r in range(self.labelings):
+            self._label(r)
+        self.count = count  # post number of the next component, see vertex_added()
+
+    def _label(self, r: int) -> None:
+        """
+        Runs search r over the condensation with an explicit stack, filling post[r] and low[r] (and first for the
+        first search). A DAG has no back edges, so every successor is finished before its parent
+        """
+        post, low, first = self.post[r], self.low[r], self.first
+        order = range(len(self.dag)) if r % 2 == 0 else range(len(self.dag) - 1, -1, -1)
+        seen = bytearray(len(self.dag))
+        counter = 0
+        for root in order:
+            if seen[root]:
+                continue
+            seen[root] = 1
+            if r == 0:
+                first[root] = counter
+            stack = [(root, iter(self.dag[root] if r % 2 == 0 else self.dag[root][::-1]))]
+            while len(stack) > 0:
+                c, successors = stack[-1]
+                for d in successors:
+                    if not seen[d]:
+                        seen[d] = 1
+                        if r == 0:
+                            first[d] = counter
+                        stack.append((d, iter(self.dag[d] if r % 2 == 0 else self.dag[d][::-1])))
+                        break
+                else:
+                    stack.pop()
+                    post[c] = counter
+                    smallest = counter
+                    for d in self.dag[c]:
+                        smallest = min(smallest, low[d])
+                    low[c] = smallest
+                    counter += 1
+
+    def _may_reach(self, c: int, d: int) -> bool:
+        """
+        Returns False if the labels prove component c does not reach component d
+        """
+        if c > d:  # edges only run forward in the topological order of the components
+            return False
+        for r in range(self.labelings):
+            if self.post[r][d] > self.post[r][c] or self.low[r][d] < self.low[r][c]:
+                return False
+        return True
+
+    def reaches(self, u: int, v: int) -> bool:
+        """
+        Returns True if vertex u reaches vertex v
+        """
+        c, d = self.component[u], self.component[v]
+        if c == d or self.first[c] <= self.post[0][d] <= self.post[0][c]:
+            return True
+        if not self._may_reach(c, d):
+            return False
+        stack = [c]
+        seen = {c}
+        while len(stack) > 0:
+            for x in self.dag[stack.pop()]:
+                if self.first[x] <= self.post[0][d] <= self.post[0][x]:  # d is x or a tree descendant of x
+                    return True
+                if x not in seen and self._may_reach(x, d):
+                    seen.add(x)
+                    stack.append(x)
+        return False
+
+    def edge_added(self, src: int, dst: int) -> bool:
+        """
+        Called by the graph after a new edge src -> dst. Returns True when src already reached dst, so no answer
+        changes, and False otherwise, which means the labels are stale and the index has to be rebuilt
+        """
+        return self.reaches(src, dst)
+
+    def vertex_added(self, v: int) -> None:
+        """
+        Called by the graph after add_vertex() returned vertex v (a new slot or a reused id), which becomes a
+        component of its own that only reaches itself: it is numbered after every labeled component, so its range
+        lies outside all of theirs and theirs outside its own
+        """
+        c = len(self.dag)
+        if v == len(self.component):
+            self.component.append(c)
+        else:
+            self.component[v] = c
+        self.dag.append([])
+        for r in range(self.labelings):
+            self.post[r].append(self.count)
+            self.low[r].append(self.count)
+        self.first.append(self.count)
+        self.count += 1
+
 
 class DirectedGraph:
     """
@@ -53,17 +798,347 @@ class DirectedGraph:
 
     # ------------------------------------------------------------------ #
 
+    _storage = None  # storage backend, created over adj_matrix on first use
+    _cycle_found = None  # result of the last has_cycle() pass, None when edits since then may have changed it
+    _topo_pos = None  # position of each vertex in a topological order, kept while the graph is known to be acyclic
+    _topo_order = None  # the inverse of _topo_pos, the vertex at each position
+    _topo_mode = False  # True while add_edge maintains the topological order, see maintain_topological_order()
+    _rejected = None  # deque behind rejected_edges, created on first use
+    rejected_limit = 1024  # rejected_edges keeps this many of the most recent rejections
+    _landmarks = None  # attached LandmarkIndex, kept up to date by the mutating methods
+    _reach = None  # _ReachabilityIndex built by reachable(), dropped by edits it cannot absorb
+    _removed = None  # bytearray marking removed vertex ids (tombstones), None until the first remove_vertex()
+    _free = None  # removed ids in the order they were freed, add_vertex() reuses the last one
+    _shared = False  # True while a snapshot shares the storage and tombstones, see snapshot()
+    _generation = 0  # edit counter, see generation
+
+    def _store(self):
+        """
+        Returns the storage backend of the graph, wrapping adj_matrix in the dense backend the first time it is needed
+        """
+        if self._storage is None:
+            self._storage = _DenseStorage(self.adj_matrix)
+        return self._storage
+
+    def _writable(self):
+        """
+        Returns the storage backend ready for an edit. The first edit after snapshot() gives the graph its own outer
+        tables and tombstones, leaving the ones the snapshot holds untouched
+        """
+        store = self._store()
+        self._generation += 1
+        if self._shared:
+            store.unshare()
+            if store.kind == 'dense':
+                self.adj_matrix = store.matrix
+            if self._removed is not None:
+                self._removed = bytearray(self._removed)
+                self._free = list(self._free)
+            self._shared = False
+        return store
+
+    def snapshot(self):
+        """
+        Returns a read-only copy of the graph in O(1). The snapshot shares its storage with the graph, and the graph
+        copies a row or adjacency list the first time it edits it afterwards (the numpy backend copies its whole
+        matrix on the first edit), so the snapshot never changes. Any number of threads can query a snapshot while
+        the graph keeps being edited, and a snapshot is freed as soon as the last reference to it is dropped
+        """
+        store = self._store()
+        frozen = FrozenDirectedGraph()
+        frozen._storage = copy.copy(store)
+        frozen._storage.owned = None
+        frozen.v_count = self.v_count
+        frozen.adj_matrix = store.matrix if store.kind == 'dense' else _MatrixView(frozen._storage)
+        frozen._removed, frozen._free = self._removed, self._free
+        frozen._generation = self._generation
+        self._shared = True
+        return frozen
+
+    @property
+    def generation(self) -> int:
+        """
+        Returns a counter that grows with every edit of the graph (every call of a mutating method), so a caller can
+        tell whether a snapshot() it took earlier still matches the graph
+        """
+        return self._generation
+
+    @classmethod
+    def _from_storage(cls, storage):
+        """
+        Returns a new graph that uses the given storage backend as is
+        """
+        graph = cls()
+        graph._storage = storage
+        graph.v_count = storage.n
+        graph.adj_matrix = storage.matrix if storage.kind == 'dense' else _MatrixView(storage)
+        return graph
+
+    @classmethod
+    def from_edge_stream(cls, edges, storage='csr'):
+        """
+        Takes any iterable of (src, dst, weight) tuples, including a generator, and returns the same graph as
+        DirectedGraph(list(edges)) without growing the matrix one vertex at a time: the edges are collected in one
+        pass and the storage is built at its final size. One difference: no edges give an empty graph. storage is
+        'csr' (default), 'dense' or 'numpy', see set_storage()
+        """
+        sources, destinations, weights = array('q'), array('q'), []
+        for u, v, weight in edges:
+            sources.append(u)
+            destinations.append(v)
+            weights.append(weight)
+        return cls._from_columns(sources, destinations, _weight_array(weights), storage)
+
+    @classmethod
+    def from_file(cls, path: str, fmt=None, storage='csr', header=None):
+        """
+        Takes the path of an edge file and returns the graph it describes. fmt is 'csv', 'tsv' (whitespace separated)
+        or 'binary' (see graph_io.write_edge_file) and is guessed from the suffix when omitted. Text lines are
+        'src,dst[,weight]', and binary files are read column by column from a memory map. header says whether the
+        first line of a text file is a header (guessed when None, see graph_io.iter_text_edges). A binary file holds
+        one weight type, so if any weight in it is a float every weight comes back as a float
+        """
+        fmt = edge_format(path, fmt)
+        if fmt != 'binary':
+            return cls.from_edge_stream(iter_text_edges(path, fmt, header=header), storage)
+        sources, destinations, weights, _ = read_edge_columns(path)
+        if weights is None:
+            weights = array('q', [1]) * len(sources)
+        return cls._from_columns(sources, destinations, weights, storage)
+
+    @classmethod
+    def _from_columns(cls, sources, destinations, weights, storage: str):
+        """
+        Builds a graph from parallel arrays of sources, destinations and weights with the same rules as add_edge():
+        loops and negative vertices are skipped, a repeated edge keeps its last weight, and a weight of 0 or less
+        means no edge. The vertex count follows __init__, one more than the largest vertex mentioned
+        """
+        n = 0
+        if len(sources) > 0:
+            n = max(0, max(sources), max(destinations)) + 1
+        if np is not None and len(sources) > 0 and not isinstance(weights, list):  # a list holds mixed weight types
+            packed = _csr_from_columns_numpy(n, sources, destinations, weights)
+        else:
+            rows = [None] * n  # {dst: weight} per source, filled in input order so the last weight wins
+            for i in range(len(sources)):
+                u, v = sources[i], destinations[i]
+                if u != v and u >= 0 and v >= 0:
+                    if rows[u] is None:
+                        rows[u] = dict()
+                    rows[u][v] = weights[i]
+            offsets, targets, packed_weights = array('q', [0]), array('q'), []
+            for u in range(n):
+                if rows[u] is not None:
+                    for v in sorted(rows[u]):
+                        if rows[u][v] > 0:
+                            targets.append(v)
+                            packed_weights.append(rows[u][v])
+                offsets.append(len(targets))
+            packed = _CSRStorage(n, offsets, targets, _weight_array(packed_weights))
+        graph = cls._from_storage(packed)
+        if storage != 'csr':
+            graph.set_storage(storage)
+        return graph
+
+    snapshot_magic = b'DGSN'
+    snapshot_version = 1
+    snapshot_header = '<4sIIqqq'  # magic, version, flags, vertex slots, listed vertices, edges
+
+    def save(self, path: str) -> None:
+        """
+        Takes a file path and writes a snapshot of the graph: a versioned header, the vertex id table, then the CSR
+        offsets, targets and weights as 8 byte aligned little endian columns that load() can use in place. The weight
+        column has one type, so when integer and float weights are mixed they are all written as floats
+        """
+        with atomic_write(path) as f:
+            for part in self._snapshot_parts():
+                f.write(part)  # arrays and memoryviews both expose their raw bytes
+
+    @classmethod
+    def load(cls, path: str, mmap=True):
+        """
+        Takes the path of a file written by save() and returns the graph. With mmap (the default) the file is memory
+        mapped and the CSR backend reads its columns in place, so the graph is usable immediately without parsing,
+        and processes loading the same file share one copy of its pages. Edits go to the delta buffer and never touch
+        the file. With mmap False the columns are copied into memory
+        """
+        return cls._from_snapshot(open_buffer(path, mmap), not mmap, path)
+
+    def _snapshot_parts(self) -> []:
+        """
+        Returns the pieces of the snapshot layout written by save(), in order
+        """
+        packed = self._packed()
+        vertices = array('q', self.get_vertices())
+        weights = packed.weights
+        if isinstance(weights, list):  # mixed integer and float weights
+            weights = array('d', weights)
+        flags = FLOAT_WEIGHTS if _typecode(weights) == 'd' else 0
+        header = struct.pack(self.snapshot_header, self.snapshot_magic, self.snapshot_version, flags, self.v_count,
+                             len(vertices), packed.edge_count)
+        offsets = packed.offsets
+        if len(offsets) <= self.v_count:  # vertices added after packing have empty rows but still need an offset
+            offsets = array('q', offsets)
+            offsets.extend([offsets[-1]] * (self.v_count + 1 - len(offsets)))
+        return [header + padding(len(header)), vertices, offsets, packed.targets, weights]
+
+    @classmethod
+    def _from_snapshot(cls, buffer: memoryview, copy: bool, source='buffer'):
+        """
+        Builds a graph from a buffer holding the snapshot layout, either using the columns in place or copying them
+        """
+        magic, version, flags, n, listed, edges = struct.unpack_from(cls.snapshot_header, buffer, 0)
+        if magic != cls.snapshot_magic or version != cls.snapshot_version:
+            raise ValueError(f'{source} is not a version {cls.snapshot_version} DirectedGraph snapshot')
+        offset = struct.calcsize(cls.snapshot_header)
+        vertices, offset = take_column(buffer, offset, 'q', listed, copy)
+        offsets, offset = take_column(buffer, offset, 'q', n + 1, copy)
+        targets, offset = take_column(buffer, offset, 'q', edges, copy)
+        weights, offset = take_column(buffer, offset, 'd' if flags & FLOAT_WEIGHTS else 'q', edges, copy)
+        graph = cls._from_storage(_CSRStorage(n, offsets, targets, weights))
+        if listed < n:  # the slots missing from the vertex table were removed vertices
+            graph._removed = bytearray(b'\1') * n
+            for v in vertices:
+                graph._removed[v] = 0
+            graph._free = [v for v in range(n) if graph._removed[v]]
+        return graph
+
+    def _packed(self):
+        """
+        Returns the edges as a CSR backend with no pending delta, which is the current backend when it is already
+        packed
+        """
+        store = self._store()
+        if store.kind == 'csr' and len(store.delta) == 0:
+            return store
+        if store.kind == 'numpy':
+            return store.packed()
+        return _CSRStorage.from_storage(store, self.v_count)
+
+    def set_storage(self, kind: str) -> None:
+        """
+        Takes the name of a storage backend and converts the graph to it. 'dense' keeps the adjacency matrix, 'csr'
+        packs the edges into compressed sparse rows so memory is O(V + E) and add_vertex is O(1), 'numpy' keeps the
+        matrix as a numpy array so neighbor scans and the bulk queries (edge_arrays(), out_degrees(), in_degrees(),
+        reachable_from(), set_weights()) run as array operations. With csr or numpy storage, adj_matrix is a read-only
+        view that builds rows on demand
+        """
+        store = self._store()
+        if kind == store.kind:
+            return
+        if kind == 'csr':
+            self._storage = self._packed()
+            self.adj_matrix = _MatrixView(self._storage)
+        elif kind == 'numpy':
+            if np is None:
+                raise ImportError('the numpy storage backend needs numpy')
+            self._storage = _NumpyStorage.from_packed(self._packed(), self.v_count)
+            self.adj_matrix = _MatrixView(self._storage)
+        elif kind == 'dense':
+            matrix = [[0] * self.v_count for _ in range(self.v_count)]
+            for u in range(self.v_count):
+                for v, w in store.successors(u):
+                    matrix[u][v] = w
+            self.adj_matrix = matrix
+            self._storage = _DenseStorage(matrix)
+        else:
+            raise ValueError(f"unknown storage backend '{kind}', expected 'dense', 'csr' or 'numpy'")
+
     def add_vertex(self) -> int:
         """
-        Adds a new vertex to the graph and then returns the number of vertices in the graph after the new addition
+        Adds a new vertex to the graph and then returns the number of vertices in the graph after the new addition.
+        If vertices were removed, the new vertex takes the most recently freed id instead of a new one, so the count
+        is not its id; new_vertex() returns the id
+        """
+        self.new_vertex()
+        return self.v_count - len(self._free) if self._free is not None else self.v_count
+
+    def new_vertex(self) -> int:
+        """
+        Adds a new vertex to the graph like add_vertex() and returns its id: the most recently freed id if vertices
+        were removed, otherwise the next new id
         """
-        self.adj_matrix.append([])  # adds an empty list to the end of the matrix
+        if self._free is not None and len(self._free) > 0:
+            self._writable()
+            v = self._free.pop()  # a removed vertex has no edges, so its slot is already an empty vertex
+            self._removed[v] = 0
+            if self._reach is not None:
+                self._reach.vertex_added(v)
+            return v
+        self._writable().add_vertex()  # the dense backend grows every row, the sparse backend only counts the vertex
+        if self._cycle_found is False:  # a vertex without edges can go last in the topological order
+            self._topo_pos.append(self.v_count)
+            self._topo_order.append(self.v_count)
+        if self._landmarks is not None:
+            self._landmarks.vertex_added()
+        if self._reach is not None:
+            self._reach.vertex_added(self.v_count)
+        if self._removed is not None:
+            self._removed.append(0)
         self.v_count += 1  # increment count
-        for i in range(self.v_count):  # appends 0s to make the new vertex the appropriate length
-            self.adj_matrix[self.v_count - 1].append(0)
-        for i in range(self.v_count-1):  # adds a new index to all existing vertices
-            self.adj_matrix[i].append(0)
-        return self.v_count
+        return self.v_count - 1
+
+    def remove_vertex(self, v: int) -> None:
+        """
+        Takes a vertex and removes it with all of its incoming and outgoing edges. If the vertex is not in the graph,
+        the method does nothing. The id is only marked as removed (a tombstone) and put on a free list for
+        add_vertex() to reuse, so no other vertex is renumbered; compact() drops the empty slots
+        """
+        if not self._alive(v):
+            return
+        store = self._store()
+        for w, _ in store.successors(v):
+            self.remove_edge(v, w)
+        for u, _ in store.predecessors(v):
+            self.remove_edge(u, v)
+        self._writable()
+        if self._removed is None:
+            self._removed = bytearray(self.v_count)
+            self._free = []
+        self._removed[v] = 1
+        self._free.append(v)
+
+    def _alive(self, v: int) -> bool:
+        """
+        Returns True if v is a vertex of the graph: in range and not removed
+        """
+        return 0 <= v < self.v_count and (self._removed is None or not self._removed[v])
+
+    def compact(self) -> dict:
+        """
+        Renumbers the vertices so the ids of removed vertices disappear, keeping the remaining vertices in the same
+        relative order, and returns a dict mapping each old id to its new id. The edges are packed into CSR arrays
+        under the new ids in one O(V + E) pass and the graph goes back to its storage backend afterwards
+        """
+        vertices = self.get_vertices()
+        mapping = {old: new for new, old in enumerate(vertices)}
+        if self._removed is None:
+            return mapping
+        kind = self._store().kind
+        packed = self._packed()
+        offsets, targets, weights = array('q', [0]), array('q'), []
+        for u in vertices:
+            for v, w in packed.successors(u):
+                targets.append(mapping[v])  # ids only shrink, in order, so every row stays sorted
+                weights.append(w)
+            offsets.append(len(targets))
+        self._storage = _CSRStorage(len(vertices), offsets, targets, _weight_array(weights))
+        self.adj_matrix = _MatrixView(self._storage)
+        self.v_count = len(vertices)
+        self._removed = self._free = None
+        self._shared = False  # nothing left is shared with a snapshot
+        self._generation += 1
+        self._reach = None
+        if self._cycle_found is False:  # the same order without the removed vertices
+            self._topo_order = [mapping[v] for v in self._topo_order if v in mapping]
+            self._topo_pos = [0] * self.v_count
+            for i in range(self.v_count):
+                self._topo_pos[self._topo_order[i]] = i
+        if self._landmarks is not None:  # the stored distance rows are indexed by the old ids
+            self.build_landmark_index(len(self._landmarks.landmarks))
+        if kind != 'csr':
+            self.set_storage(kind)
+        return mapping
 
     def add_edge(self, src: int, dst: int, weight=1) -> None:
         """
@@ -71,13 +1146,40 @@ class DirectedGraph:
         index is out of range, or if src and dst are the same index, then the method performs no action.  If the edge
         already exists, then the weight is updated.
         """
+        self.try_add_edge(src, dst, weight)
+
+    def try_add_edge(self, src: int, dst: int, weight=1) -> bool:
+        """
+        Takes the same arguments as add_edge() and does the same, and returns False if the graph was left unchanged
+        because an index is invalid or, while the topological order is maintained, because the edge would close a
+        cycle (such an edge is also recorded in rejected_edges). Returns True otherwise
+        """
         if src == dst:
-            return
+            return False
         if src < 0 or src > self.v_count-1:
-            return
+            return False
         if dst < 0 or dst > self.v_count-1:
-            return
-        self.adj_matrix[src][dst] = weight
+            return False
+        if self._removed is not None and (self._removed[src] or self._removed[dst]):
+            return False
+        # an edge that runs backwards in the last topological order may close a cycle
+        if self._cycle_found is False and weight > 0 and self._topo_pos[src] > self._topo_pos[dst]:
+            if not self._topo_mode:
+                self._cycle_found = None
+            elif not self._reorder_for_edge(src, dst):  # the edge would close a cycle, reject it
+                self.rejected_edges.append((src, dst, weight))
+                return False
+        store = self._writable()
+        old = store.weight(src, dst)
+        store.set_weight(src, dst, weight)
+        if self._landmarks is not None:
+            self._landmarks.edge_changed(src, dst, old, weight)
+        if self._reach is not None and (old > 0) != (weight > 0):
+            if weight <= 0 or not self._reach.edge_added(src, dst):
+                self._reach = None
+        if weight <= 0 < old and self._cycle_found is True:  # a weight of 0 removed the edge, see remove_edge()
+            self._cycle_found = None
+        return True
 
     def remove_edge(self, src: int, dst: int) -> None:
         """
@@ -90,40 +1192,176 @@ class DirectedGraph:
             return
         if dst < 0 or dst > self.v_count-1:
             return
-        self.adj_matrix[src][dst] = 0
+        store = self._writable()
+        old = store.weight(src, dst)
+        store.set_weight(src, dst, 0)
+        if self._landmarks is not None:
+            self._landmarks.edge_changed(src, dst, old, 0)
+        if old > 0:  # a removed edge may cut paths the reachability index relies on
+            self._reach = None
+        if self._cycle_found is True:  # removing an edge may have broken the cycle, an acyclic graph stays acyclic
+            self._cycle_found = None
 
     def get_vertices(self) -> []:
         """
         Returns a list containing the vertices of the graph
         """
-        vertices = []
-        for x in range(len(self.adj_matrix)):
-            vertices.append(x)
-        return vertices
+        if self._removed is not None:
+            return [v for v in range(self.v_count) if not self._removed[v]]
+        return list(range(self.v_count))
 
     def get_edges(self) -> []:
         """
         Returns the edges in the graph as a tuple containing the incident vertices and the edge weight
         """
+        store = self._store()
+        if store.kind == 'numpy':  # one nonzero() over the whole matrix instead of a scan per row
+            return list(zip(*(column.tolist() for column in store.edge_arrays())))
         edges = []
-        for x in range(len(self.adj_matrix)):
-            for y in range(len(self.adj_matrix[x])):
-                if self.adj_matrix[x][y] > 0:  # if an edge exists
-                    temp = (x, y, self.adj_matrix[x][y])  # store it as a tuple
-                    edges.append(temp)  # append the tuple to the list
+        for x in range(self.v_count):
+            for y, weight in store.successors(x):  # only existing edges are visited
+                edges.append((x, y, weight))  # store it as a tuple
         return edges
 
+    def edge_arrays(self) -> ():
+        """
+        Returns the edges as three numpy arrays (sources, destinations, weights) in the same order as get_edges().
+        Needs numpy, and with numpy storage it is a single nonzero() over the matrix
+        """
+        if np is None:
+            raise ImportError('edge_arrays() needs numpy')
+        store = self._store()
+        if store.kind == 'numpy':
+            return store.edge_arrays()
+        packed = self._packed()
+        offsets = np.asarray(packed.offsets, dtype=np.int64)
+        sources = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        return sources, np.array(packed.targets, dtype=np.int64), np.array(packed.weights)
+
+    def out_degrees(self):
+        """
+        Returns a numpy array holding the number of edges leaving each vertex. Needs numpy
+        """
+        if np is None:
+            raise ImportError('out_degrees() needs numpy')
+        store = self._store()
+        if store.kind == 'numpy':
+            return np.count_nonzero(store.matrix > 0, axis=1)
+        return np.bincount(self.edge_arrays()[0], minlength=self.v_count)
+
+    def in_degrees(self):
+        """
+        Returns a numpy array holding the number of edges entering each vertex. Needs numpy
+        """
+        if np is None:
+            raise ImportError('in_degrees() needs numpy')
+        store = self._store()
+        if store.kind == 'numpy':
+            return np.count_nonzero(store.matrix > 0, axis=0)
+        return np.bincount(self.edge_arrays()[1], minlength=self.v_count)
+
+    def reachable_from(self, src: int):
+        """
+        Takes a starting vertex and returns a numpy boolean array marking every vertex reachable from it (src
+        included, nothing when src is not in the graph). The search expands one whole BFS frontier per step: with numpy
+        storage a step is an any() over the frontier rows of the matrix, otherwise a gather from packed edge arrays.
+        Needs numpy
+        """
+        if np is None:
+            raise ImportError('reachable_from() needs numpy')
+        n = self.v_count
+        reached = np.zeros(n, dtype=bool)
+        if not self._alive(src):
+            return reached
+        reached[src] = True
+        frontier = np.array([src])
+        store = self._store()
+        if store.kind == 'numpy':
+            matrix = store.matrix
+            while len(frontier) > 0:
+                step = np.any(matrix[frontier] > 0, axis=0) & ~reached
+                reached |= step
+                frontier = np.flatnonzero(step)
+            return reached
+        sources, targets, _ = self.edge_arrays()
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=n))))
+        while len(frontier) > 0:
+            starts, lengths = offsets[frontier], offsets[frontier + 1] - offsets[frontier]
+            # index of every edge leaving the frontier: each start repeated over its row, plus the position in the row
+            ends = np.cumsum(lengths)
+            edges = np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1])
+            step = np.unique(targets[edges])
+            frontier = step[~reached[step]]
+            reached[frontier] = True
+        return reached
+
+    def set_weights(self, sources, destinations, weights) -> None:
+        """
+        Takes parallel sequences (lists, arrays or numpy arrays) of sources, destinations and weights and applies them
+        as add_edge() would one at a time: loops and out of range vertices are skipped, a repeated pair keeps its last
+        weight and a weight of 0 or less removes the edge. With numpy storage the batch is one array assignment,
+        unless a landmark index or a maintained topological order needs to see each edit
+        """
+        store = self._writable()
+        if store.kind != 'numpy' or self._landmarks is not None or self._topo_mode:
+            if np is not None:  # add_edge() expects plain Python numbers
+                sources, destinations, weights = (np.asarray(column).tolist()
+                                                  for column in (sources, destinations, weights))
+            for src, dst, weight in zip(sources, destinations, weights):
+                self.add_edge(src, dst, weight)
+            return
+        n = self.v_count
+        sources = np.asarray(sources, dtype=np.int64)
+        destinations = np.asarray(destinations, dtype=np.int64)
+        weights = np.asarray(weights)
+        keep = (sources != destinations) & (sources >= 0) & (sources < n) & (destinations >= 0) & (destinations < n)
+        sources, destinations, weights = sources[keep], destinations[keep], weights[keep]
+        if self._removed is not None:  # removed vertices take no edges
+            removed = np.frombuffer(bytes(self._removed), dtype=np.uint8)
+            keep = (removed[sources] == 0) & (removed[destinations] == 0)
+            sources, destinations, weights = sources[keep], destinations[keep], weights[keep]
+        _, last = np.unique((sources * n + destinations)[::-1], return_index=True)
+        last = len(sources) - 1 - last  # position of the last copy of each pair
+        store.set_weights(sources[last], destinations[last], weights[last])
+        self._cycle_found = None
+        self._reach = None
+
     def is_valid_path(self, path: []) -> bool:
         """
         Takes a list containing a path, then traverses that path. If able to traverse the whole path, it is valid and
-        this method returns True. Otherwise, it returns false
+        this method returns True. Otherwise, it returns false, including when the path names a vertex that is not in
+        the graph
         """
-        if path == []:
-            return True
-        for x in range(len(path)-1):
-            if self.adj_matrix[path[x]][path[x+1]] == 0:
-                return False
-        return True
+        return self._first_invalid_hop(path, self._store()) < 0
+
+    def validate_paths(self, paths) -> ():
+        """
+        Takes an iterable of paths (read one at a time, so it can be a generator streaming a log) and checks each one
+        like is_valid_path(). Returns a tuple (valid, first_invalid) with one entry per path: valid is a bytearray of
+        1 / 0 flags and first_invalid an array holding the index i of the first hop path[i] -> path[i + 1] that is not
+        an edge (0 when the only vertex is not in the graph), or -1 for a valid path
+        """
+        store = self._store()
+        valid = bytearray()
+        first_invalid = array('q')
+        for path in paths:
+            hop = self._first_invalid_hop(path, store)
+            valid.append(hop < 0)
+            first_invalid.append(hop)
+        return valid, first_invalid
+
+    def _first_invalid_hop(self, path: [], store) -> int:
+        """
+        Helper method for is_valid_path() and validate_paths(), returns the index of the first hop of path that is not
+        an edge, or -1 if there is none. Each hop is a range check and one weight lookup in storage
+        """
+        n = self.v_count
+        if len(path) > 0 and not self._alive(path[0]):
+            return 0
+        for x in range(len(path) - 1):
+            if not 0 <= path[x + 1] < n or store.weight(path[x], path[x + 1]) <= 0:
+                return x
+        return -1
 
     def dfs(self, v_start, v_end=None) -> []:
         """
@@ -131,27 +1369,30 @@ class DirectedGraph:
         the graph, returning a list of the vertices visited. If the start vertex is not in the list, then an empty list
         is returned, and if the end vertex does not exist then the end vertex is set to None.
         """
-        if v_start not in self.get_vertices():
-            return []
-        if v_end is not None and v_end not in self.get_vertices():
-            v_end = None
-        visited_vertices = []
-        stack = deque([v_start])
+        return list(self.iter_dfs(v_start, v_end))
+
+    def iter_dfs(self, v_start, v_end=None):
+        """
+        Generator version of dfs(), yields the vertices one at a time in the same order so the caller can stop early.
+        Visited vertices are tracked in a bitmap, and the successor lists come from storage already sorted
+        """
+        if not self._alive(v_start):
+            return
+        store = self._store()
+        visited = bytearray(self.v_count)
+        stack = [v_start]
         while len(stack) > 0:
             temp = stack.pop()
-            temp_list = []  # used to add vertices to the visited vertices list
-            if temp not in visited_vertices:
-                visited_vertices.append(temp)
+            if visited[temp]:  # reached again through another vertex before it was popped
+                continue
+            visited[temp] = 1
+            yield temp
             if temp == v_end:
-                break
-            for x in range(len(self.adj_matrix[temp])):  # iterate through reachable vertices
-                if self.adj_matrix[temp][x] > 0:
-                    temp_list.append(x)
-                temp_list.sort(reverse=True)  # creates a descending order list of reachable vertices
-            for x in range(len(temp_list)):
-                if temp_list[x] not in visited_vertices:
-                    stack.append(temp_list[x])  # append vertcies to stack so they are visited in ascending order
-        return visited_vertices
+                return
+            successors = store.successors(temp)
+            for x in range(len(successors) - 1, -1, -1):  # push in descending order so they are visited ascending
+                if not visited[successors[x][0]]:
+                    stack.append(successors[x][0])
 
     def bfs(self, v_start, v_end=None) -> []:
         """
@@ -159,64 +1400,281 @@ class DirectedGraph:
         the graph, returning a list of the vertices visited. If the start vertex is not in the list, then an empty list
         is returned, and if the end vertex does not exist then the end vertex is set to None.
         """
-        if v_start not in self.get_vertices():
-            return []
-        if v_end is not None and v_end not in self.get_vertices():
-            v_end = None
-        visited_vertices = []
+        return list(self.iter_bfs(v_start, v_end))
+
+    def iter_bfs(self, v_start, v_end=None):
+        """
+        Generator version of bfs(), yields the vertices one at a time in the same order so the caller can stop early.
+        A vertex is marked in the bitmap when it is queued, so no queue membership scans are needed
+        """
+        if not self._alive(v_start):
+            return
+        store = self._store()
+        queued = bytearray(self.v_count)
+        queued[v_start] = 1
         queue = deque([v_start])
         while len(queue) > 0:
-            temp = queue.pop()
-            temp_list = []  # used to add vertices in numerical order
-            visited_vertices.append(temp)
+            temp = queue.popleft()
+            yield temp
             if temp == v_end:
-                break
-            for x in range(len(self.adj_matrix[temp])):  # iterate through reachable vertices
-                if self.adj_matrix[temp] not in visited_vertices and self.adj_matrix[temp][x] > 0:
-                    temp_list.append(x)
-            temp_list.sort()  # creates a ascending list of reachable vertices
-            for x in range(len(temp_list)):
-                # if not visited yet and not already in queue for bfs
-                if temp_list[x] not in visited_vertices and temp_list[x] not in queue:
-                    # append vertcies to stack so they are visited in ascending lexicographical order
-                    queue.appendleft(temp_list[x])
-        return visited_vertices
-
-    def has_cycle(self):
-        """
-        Searches the graph for a cycle, returns True if a cycle exists, and returns False if no cycle exists.
-        """
-        unsearched_vertices = self.get_vertices()  # creates a list of all vertices
-        while len(unsearched_vertices) > 0:  # perform a DFS on each vertex using helper method
-            has_cycle = self.has_cycle_helper(unsearched_vertices[0])  # store the true or false value
-            if has_cycle is True:  # if a cycle exists, break
-                return True
-            unsearched_vertices.remove(unsearched_vertices[0])  # if a cycle doesn't exist, remove vertex and continue
-        return False  # no cycles exist
-
-    def has_cycle_helper(self, v):
-        """
-        Helper method that takes a vertex, and the list of parent vertices, does a DFS starting from v and returns true
-        if a cycle exists from v
-        """
-        visited_vertices = []
-        stack = deque([v])
+                return
+            for x, _ in store.successors(temp):  # already in ascending order
+                if not queued[x]:
+                    queued[x] = 1
+                    queue.append(x)
+
+    def bfs_levels(self, v_start: int, direction='auto', workers=None) -> ():
+        """
+        Takes a starting vertex and runs a level-synchronous BFS that expands the whole frontier at each step, then
+        returns a tuple (hops, parents) of lists indexed by vertex: the number of edges on a shortest path from
+        v_start and the vertex it was reached from (-1 for v_start and unreached vertices). direction is 'top-down',
+        'bottom-up' or 'auto' (switch per level to whichever is cheaper), hops never depend on it but parents may.
+        workers > 1 splits the large steps between that many processes, see graph_bfs.level_bfs()
+        """
+        packed = self._packed()
+
+        def reverse():
+            if packed.in_offsets is None:
+                packed._build_reverse()
+            return packed.in_offsets, packed.in_sources
+
+        start = v_start if self._alive(v_start) else -1
+        hops, parents = level_bfs(self.v_count, (packed.offsets, packed.targets), reverse, start, direction, workers)
+        return hops.tolist(), parents.tolist()
+
+    def has_cycle(self, incremental=False) -> bool:
+        """
+        Searches the graph for a cycle, returns True if a cycle exists, and returns False if no cycle exists. When
+        incremental is True, the result of the previous check is reused if the edits since then cannot have changed
+        it (only add_edge calls that respect the last topological order, or any edits after a cycle was found that
+        did not remove an edge)
+        """
+        if incremental and self._cycle_found is not None:
+            return self._cycle_found
+        return len(self.find_cycle()) > 0
+
+    def find_cycle(self) -> []:
+        """
+        Runs a single white/gray/black depth first search over the graph in O(V + E). Returns the vertices of a cycle
+        as a closed path (first and last vertex equal, so it passes is_valid_path), or an empty list if the graph is
+        acyclic
+        """
+        store = self._store()
+        color = bytearray(self.v_count)  # 0 = unvisited, 1 = on the current DFS path, 2 = finished
+        parent = [-1] * self.v_count
+        finished = []  # vertices in the order their DFS finished, reversed this is a topological order
+        for root in range(self.v_count):
+            if color[root] != 0:
+                continue
+            color[root] = 1
+            stack = [(root, iter(store.successors(root)))]  # iterative so deep graphs do not hit the recursion limit
+            while len(stack) > 0:
+                u, edges = stack[-1]
+                for v, _ in edges:
+                    if color[v] == 0:  # descend into the first unvisited successor
+                        color[v] = 1
+                        parent[v] = u
+                        stack.append((v, iter(store.successors(v))))
+                        break
+                    if color[v] == 1:  # edge back onto the current path closes a cycle
+                        cycle = [u]
+                        while cycle[-1] != v:
+                            cycle.append(parent[cycle[-1]])
+                        cycle.reverse()
+                        cycle.append(v)
+                        self._cycle_found = True
+                        self._topo_pos = None
+                        return cycle
+                else:  # every successor explored
+                    color[u] = 2
+                    finished.append(u)
+                    stack.pop()
+        finished.reverse()
+        self._topo_order = finished
+        self._topo_pos = [0] * self.v_count
+        for i in range(len(finished)):
+            self._topo_pos[finished[i]] = i
+        self._cycle_found = False
+        return []
+
+    def maintain_topological_order(self, enabled=True) -> bool:
+        """
+        Turns the dynamic topological order mode on or off. While it is on, add_edge keeps a topological order up to
+        date (Pearce-Kelly), only searching the vertices between the two endpoints in the current order, and an edge
+        that would close a cycle is not added (try_add_edge() returns False for it) and is recorded in rejected_edges
+        instead, which starts out empty. Returns False, leaving the mode off, if the graph already has a cycle
+        """
+        if not enabled:
+            self._topo_mode = False
+            return True
+        if self._cycle_found is not False and len(self.find_cycle()) > 0:
+            return False
+        self._topo_mode = True
+        self._rejected = None
+        return True
+
+    @property
+    def rejected_edges(self) -> deque:
+        """
+        Returns a deque of the (src, dst, weight) edges turned down because they would have closed a cycle while the
+        topological order was maintained, oldest first. Only the last rejected_limit of them are kept
+        """
+        if self._rejected is None:
+            self._rejected = deque(maxlen=self.rejected_limit)
+        return self._rejected
+
+    def topological_order(self) -> []:
+        """
+        Returns the vertices in a topological order, or an empty list if the graph has a cycle. While the order is
+        maintained (see maintain_topological_order) this is a copy of the stored order with no search
+        """
+        if self._cycle_found is None:
+            self.find_cycle()
+        if self._cycle_found:
+            return []
+        if self._removed is not None:
+            return [v for v in self._topo_order if not self._removed[v]]
+        return list(self._topo_order)
+
+    def strongly_connected_components(self) -> []:
+        """
+        Returns the strongly connected components of the graph as lists of vertices (each in ascending order). The
+        components come in a topological order of the condensation: every edge between two components runs from an
+        earlier one to a later one, so a component of more than one vertex is exactly a set of vertices on cycles
+        """
+        return self._scc()[0]
+
+    def _scc(self) -> ():
+        """
+        Helper method for strongly_connected_components() and condensation(). Runs Tarjan's algorithm in O(V + E)
+        with an explicit stack of (vertex, successor iterator) pairs instead of recursion, and returns a tuple
+        (components, component) where component[v] is the index of the component holding v (-1 for a removed vertex)
+        """
+        store = self._store()
+        n = self.v_count
+        index = array('q', [-1]) * n  # DFS discovery number, -1 until visited
+        low = array('q', [0]) * n  # smallest discovery number reachable through the DFS subtree and one back edge
+        on_stack = bytearray(n)
+        stack = []  # visited vertices whose component is not finished yet
+        found = []  # components in the order Tarjan completes them, which is reverse topological
+        counter = 0
+        for root in self.get_vertices():  # removed vertices belong to no component
+            if index[root] >= 0:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [(root, iter(store.successors(root)))]
+            while len(work) > 0:
+                u, edges = work[-1]
+                for v, _ in edges:
+                    if index[v] < 0:  # descend into the first unvisited successor
+                        index[v] = low[v] = counter
+                        counter += 1
+                        stack.append(v)
+                        on_stack[v] = 1
+                        work.append((v, iter(store.successors(v))))
+                        break
+                    if on_stack[v] and index[v] < low[u]:
+                        low[u] = index[v]
+                else:  # every successor explored, pass low up to the parent
+                    work.pop()
+                    if len(work) > 0 and low[u] < low[work[-1][0]]:
+                        low[work[-1][0]] = low[u]
+                    if low[u] == index[u]:  # u is the root of a component, which sits on top of the stack
+                        members = []
+                        while True:
+                            v = stack.pop()
+                            on_stack[v] = 0
+                            members.append(v)
+                            if v == u:
+                                break
+                        members.sort()
+                        found.append(members)
+        found.reverse()
+        component = array('q', [-1]) * n
+        for c in range(len(found)):
+            for v in found[c]:
+                component[v] = c
+        return found, component
+
+    def condensation(self):
+        """
+        Returns the condensation of the graph as a new DirectedGraph (csr storage): vertex i stands for component i of
+        strongly_connected_components() and there is an edge i -> j when some edge leads from component i to
+        component j, weighted with the smallest such edge weight. The result is acyclic and every edge runs from a
+        lower to a higher vertex, so range(v_count) is a topological order of it. Called on a snapshot, the result is
+        still an ordinary, editable DirectedGraph
+        """
+        components, component = self._scc()
+        store = self._store()
+        offsets, targets, weights = array('q', [0]), array('q'), []
+        for c in range(len(components)):
+            lightest = dict()
+            for u in components[c]:
+                for v, w in store.successors(u):
+                    d = component[v]
+                    if d != c and (d not in lightest or w < lightest[d]):
+                        lightest[d] = w
+            for d in sorted(lightest):
+                targets.append(d)
+                weights.append(lightest[d])
+            offsets.append(len(targets))
+        return DirectedGraph._from_storage(_CSRStorage(len(components), offsets, targets, _weight_array(weights)))
+
+    def reachable(self, u: int, v: int) -> bool:
+        """
+        Takes two vertices and returns True if there is a path from u to v (every vertex reaches itself), False
+        otherwise or if either one is not in the graph. The first call builds an O(V) index of interval labels over
+        the strongly connected components (see _ReachabilityIndex): most queries are settled by comparing two labels,
+        the rest by a search of the condensation that the labels prune. An added edge keeps the index when it adds
+        no new path, any other added edge and any removed edge drop it until the next query
+        """
+        if not self._alive(u) or not self._alive(v):
+            return False
+        if self._reach is None:
+            self._reach = _ReachabilityIndex(self)
+        return self._reach.reaches(u, v)
+
+    def _reorder_for_edge(self, src: int, dst: int) -> bool:
+        """
+        Pearce-Kelly update for a new edge src -> dst that runs backwards in the current order. Searches forward from
+        dst and backward from src, but only through the vertices whose positions lie between the two, then shifts
+        the two regions so every vertex reached from dst comes after every vertex that reaches src. Returns False,
+        leaving the order untouched, if dst already reaches src
+        """
+        store = self._store()
+        pos = self._topo_pos
+        lower, upper = pos[dst], pos[src]
+        forward = [dst]  # vertices reachable from dst with a position before src
+        seen = {dst}
+        stack = [dst]
         while len(stack) > 0:
-            temp = stack.pop()
-            temp_list = []  # used to add vertices in reverse numerical order
-            if temp not in visited_vertices:
-                visited_vertices.append(temp)
-            if self.adj_matrix[temp][v] > 0:  # if we can reach the start node on a directed graph, cycle exists
-                return True
-            for x in range(len(self.adj_matrix[temp])):  # iterate through reachable vertices
-                if self.adj_matrix[temp][x] > 0:
-                    temp_list.append(x)
-                temp_list.sort(reverse=True)  # creates a descending order list of reachable vertices
-            for x in range(len(temp_list)):
-                if temp_list[x] not in visited_vertices and temp_list[x] not in stack:
-                    # append vertices to stack so they are visited in numerical order
-                    stack.append(temp_list[x])
-        return False  # cycle does not exist from v
+            for v, _ in store.successors(stack.pop()):
+                if v == src:  # dst reaches src, so src -> dst would close a cycle
+                    return False
+                if v not in seen and pos[v] < upper:
+                    seen.add(v)
+                    forward.append(v)
+                    stack.append(v)
+        backward = [src]  # vertices that reach src with a position after dst
+        seen = {src}
+        stack = [src]
+        while len(stack) > 0:
+            for u, _ in store.predecessors(stack.pop()):
+                if u not in seen and pos[u] > lower:
+                    seen.add(u)
+                    backward.append(u)
+                    stack.append(u)
+        backward.sort(key=pos.__getitem__)
+        forward.sort(key=pos.__getitem__)
+        moved = backward + forward  # the new relative order of the affected vertices
+        slots = sorted(pos[v] for v in moved)  # reuse the positions they already occupied
+        for i in range(len(moved)):
+            pos[moved[i]] = slots[i]
+            self._topo_order[slots[i]] = moved[i]
+        return True
 
     def dijkstra(self, src: int) -> []:
         """
@@ -224,34 +1682,350 @@ class DirectedGraph:
         in the graph, returns a list of the distances with each index being the respective index of the vertex in the
         graph
         """
-        visited_dict = dict()
-        priority_queue = [(0, src)]  # distance (priority), src, parent
-        while len(priority_queue) > 0:  # loop through every edge in the graph
-            d, v = heapq.heappop(priority_queue)  # unpack the tuple into each variable
-            if len(visited_dict) == 0:  # if this is the first vertex being visited
-                visited_dict[v] = d  # set dictionary key/value pair
-                for x in range(len(self.adj_matrix[v])):  # iterate through and append edges as new tuple
-                    if self.adj_matrix[v][x] > 0:
-                        d = self.adj_matrix[v][x]
-                        priority_queue.append((d, x))
-                heapq.heapify(priority_queue)  # heapify to prioritize the shortest distance first
-            elif v not in visited_dict:  # only execute if unvisted vertex
-                visited_dict[v] = d
-                for x in range(len(self.adj_matrix[v])):  # iterate through and append edges as new tuple
-                    if self.adj_matrix[v][x] > 0:
-                        d = self.adj_matrix[v][x]
-                        # add previous distance to tuple distance to account for travel from start vertex
-                        priority_queue.append((d + visited_dict[v], x))
-                heapq.heapify(priority_queue) # heapify to prioritize the shortest distance first
-        for x in range (len(self.adj_matrix)):
-            if x not in visited_dict:  # if a vertex was not visited, it is unreachable from src
-                visited_dict[x] = float('inf')  # set value as INFINITY
-        return_list = []
-        for x in range (len(self.adj_matrix)):
-            return_list.append(0) # create a list of 0s
-        for key, value in visited_dict.items():
-            return_list[key] = value  # set value of each index to key value from dict
-        return return_list  # return list
+        return self.shortest_path_tree(src)[0]
+
+    def shortest_path_tree(self, src: int, targets=None) -> ():
+        """
+        Takes a starting vertex (src) and an optional collection of target vertices and runs Dijkstra's algorithm with
+        a lazily pruned heap. Returns a tuple (distances, predecessors) of lists indexed by vertex, where predecessors
+        holds the previous vertex on a shortest path (-1 for src and unreached vertices). If targets are given the
+        search stops once all of them are settled, so only their distances (and the paths to them) are final
+        """
+        return self._search(src, targets, self._store().successors)
+
+    def _search(self, src: int, targets, neighbors) -> ():
+        """
+        Helper method for shortest_path_tree() that takes the function listing the (vertex, weight) neighbors to
+        relax, successors for a forward search or predecessors for distances to src
+        """
+        distances = [float('inf')] * self.v_count
+        predecessors = [-1] * self.v_count
+        if not self._alive(src):
+            return distances, predecessors
+        remaining = None
+        if targets is not None:
+            remaining = set(t for t in targets if self._alive(t))
+        settled = bytearray(self.v_count)
+        distances[src] = 0
+        priority_queue = [(0, src)]  # distance (priority), vertex
+        while len(priority_queue) > 0:
+            d, v = heapq.heappop(priority_queue)
+            if settled[v]:  # stale entry left behind by a shorter path found later
+                continue
+            settled[v] = 1
+            if remaining is not None:
+                remaining.discard(v)
+                if len(remaining) == 0:  # every target is settled
+                    break
+            for x, weight in neighbors(v):
+                if d + weight < distances[x]:  # only push when the path improves, instead of decreasing keys
+                    distances[x] = d + weight
+                    predecessors[x] = v
+                    heapq.heappush(priority_queue, (d + weight, x))
+        return distances, predecessors
+
+    def _distances(self, src: int, reverse=False) -> []:
+        """
+        Returns the list of shortest distances from src, or to src when reverse is True
+        """
+        store = self._store()
+        return self._search(src, None, store.predecessors if reverse else store.successors)[0]
+
+    floyd_step_cost = 2.5  # measured ns per (i, k, j) step of the vectorized Floyd-Warshall
+    dijkstra_vertex_cost = 4000  # measured ns per vertex of one single source Dijkstra search
+    dijkstra_edge_cost = 15  # measured ns per edge and per log2(V) of one single source Dijkstra search
+
+    def all_pairs_shortest_paths(self, strategy='auto', workers=None) -> ():
+        """
+        Computes the shortest distance between every pair of vertices. Returns a tuple (distances, predecessors) of
+        flat row-major arrays of V * V entries: float32 distances (inf when unreachable) and int32 predecessors (the
+        vertex before v on a shortest path from u is predecessors[u * V + v], -1 if none). strategy picks the
+        algorithm: 'floyd' runs a Floyd-Warshall vectorized with numpy, 'dijkstra' runs a single source Dijkstra from
+        every vertex spread over a pool of worker processes (workers, default one per CPU, see batch_dijkstra). 'auto'
+        estimates both running times, V^3 steps for Floyd-Warshall against V searches of V + E * log2(V) steps
+        shared by the workers for Dijkstra, and picks the cheaper one (Dijkstra when numpy is not installed)
+        """
+        n = self.v_count
+        packed = self._packed()
+        if strategy == 'auto':
+            floyd = self.floyd_step_cost * n ** 3
+            searches = n * (self.dijkstra_vertex_cost * n
+                            + self.dijkstra_edge_cost * packed.edge_count * math.log2(max(2, n)))
+            searches /= workers or os.cpu_count() or 1
+            strategy = 'floyd' if np is not None and floyd <= searches else 'dijkstra'
+        if strategy == 'floyd':
+            if np is None:
+                raise ImportError('the floyd strategy needs numpy')
+            return self._floyd_warshall(packed)
+        if strategy != 'dijkstra':
+            raise ValueError(f"unknown strategy '{strategy}', expected 'auto', 'floyd' or 'dijkstra'")
+        return self._pooled_rows(range(n), workers, True)
+
+    def _floyd_warshall(self, packed) -> ():
+        """
+        Helper method for all_pairs_shortest_paths(), runs Floyd-Warshall with one vectorized numpy relaxation of the
+        whole matrix per intermediate vertex
+        """
+        n = self.v_count
+        offsets = np.frombuffer(packed.offsets, dtype=np.int64)
+        sources = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        targets = np.frombuffer(packed.targets, dtype=np.int64)
+        dist = np.full((n, n), np.inf, dtype=np.float32)
+        dist[sources, targets] = np.asarray(packed.weights, dtype=np.float32)
+        pred = np.full((n, n), -1, dtype=np.int32)
+        pred[sources, targets] = sources
+        np.fill_diagonal(dist, 0)
+        for k in range(n):
+            through_k = dist[:, k, None] + dist[None, k, :]  # distance of every i -> k -> j route
+            better = through_k < dist
+            np.copyto(dist, through_k, where=better)
+            np.copyto(pred, np.broadcast_to(pred[k], (n, n)), where=better)
+        distances = array('f')
+        distances.frombytes(dist.tobytes())
+        predecessors = array('i')
+        predecessors.frombytes(pred.tobytes())
+        return distances, predecessors
+
+    def multi_source_dijkstra(self, sources) -> ():
+        """
+        Takes a collection of source vertices and runs one Dijkstra search seeded with all of them at distance 0.
+        Returns a tuple (distances, owners) of lists indexed by vertex: the distance to the nearest source and that
+        source (-1 where no source reaches). Sources that are not in the graph are skipped
+        """
+        store = self._store()
+        distances = [float('inf')] * self.v_count
+        owners = [-1] * self.v_count
+        priority_queue = []
+        for src in sources:
+            if self._alive(src) and owners[src] == -1:
+                distances[src] = 0
+                owners[src] = src
+                priority_queue.append((0, src))
+        heapq.heapify(priority_queue)
+        settled = bytearray(self.v_count)
+        while len(priority_queue) > 0:
+            d, v = heapq.heappop(priority_queue)
+            if settled[v]:
+                continue
+            settled[v] = 1
+            for x, weight in store.successors(v):
+                if d + weight < distances[x]:
+                    distances[x] = d + weight
+                    owners[x] = owners[v]  # x belongs to the source whose search reached it first
+                    heapq.heappush(priority_queue, (d + weight, x))
+        return distances, owners
+
+    def batch_dijkstra(self, sources, workers=None) -> array:
+        """
+        Takes a collection of source vertices and returns the distances from each of them as one flat row-major
+        float32 array of len(sources) * V entries (inf when unreachable). The sources are spread over a pool of
+        worker processes (workers, default one per CPU). The graph is written once into shared memory in the
+        snapshot layout of save() and every worker maps it in place, so nothing proportional to the graph is pickled
+        """
+        return self._pooled_rows(sources, workers, False)[0]
+
+    def _pooled_rows(self, sources, workers, with_predecessors: bool) -> ():
+        """
+        Helper method for batch_dijkstra() and all_pairs_shortest_paths(), returns (distances, predecessors) as flat
+        float32 / int32 arrays with one row per source (predecessors stays empty unless asked for)
+        """
+        sources = list(sources)
+        distances = array('f')
+        predecessors = array('i')
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(sources) < 64:  # not worth starting processes
+            for src in sources:
+                dist_row, pred_row = self.shortest_path_tree(src)
+                distances.extend(array('f', dist_row))
+                if with_predecessors:
+                    predecessors.extend(array('i', pred_row))
+            return distances, predecessors
+        parts = [memoryview(part).cast('B') for part in self._snapshot_parts()]
+        memory = shared_memory.SharedMemory(create=True, size=max(1, sum(len(part) for part in parts)))
+        try:
+            offset = 0
+            for part in parts:
+                memory.buf[offset:offset + len(part)] = part
+                offset += len(part)
+            tasks = [(src, with_predecessors) for src in sources]
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(memory.name,)) as pool:
+                for dist_row, pred_row in pool.map(_worker_rows, tasks, chunksize=max(1, len(tasks) // (workers * 8))):
+                    distances.extend(dist_row)
+                    if with_predecessors:
+                        predecessors.extend(pred_row)
+        finally:
+            memory.close()
+            memory.unlink()
+        return distances, predecessors
+
+    def build_landmark_index(self, k=8) -> LandmarkIndex:
+        """
+        Takes a number of landmarks, builds a LandmarkIndex for the graph and attaches it (see set_landmark_index),
+        then returns it
+        """
+        index = LandmarkIndex.build(self, k)
+        self.set_landmark_index(index)
+        return index
+
+    def set_landmark_index(self, index) -> None:
+        """
+        Attaches a LandmarkIndex (for example one read with LandmarkIndex.load) to the graph, or detaches the current
+        one when index is None. While attached, edits keep it valid and shortest_path() uses its lower bounds
+        """
+        if self._landmarks is not None:
+            self._landmarks.graph = None
+        if index is not None:
+            if len(index.landmarks) > 0 and len(index.forward[0]) != self.v_count:
+                raise ValueError(f'landmark index covers {len(index.forward[0])} vertices, graph has {self.v_count}')
+            index.graph = self
+        self._landmarks = index
+
+    def shortest_path(self, src: int, dst: int, heuristic=None) -> ():
+        """
+        Takes a source and destination vertex and returns a tuple (distance, path) for a shortest route between them,
+        or (inf, []) if dst cannot be reached or either vertex is not in the graph. Without a heuristic this runs a
+        bidirectional Dijkstra that grows a forward search from src and a backward search from dst over incoming edges
+        until they meet. A heuristic is a function taking a vertex and returning a lower bound on its distance to dst
+        (it must never overestimate), which turns the search into A*. When a landmark index is attached and no
+        heuristic is given, A* runs with the landmark lower bounds
+        """
+        if not self._alive(src) or not self._alive(dst):
+            return float('inf'), []
+        if src == dst:
+            return 0, [src]
+        if heuristic is None and self._landmarks is not None:
+            heuristic = self._landmarks.heuristic(dst)
+        if heuristic is not None:
+            return self._a_star(src, dst, heuristic)
+        return self._bidirectional_dijkstra(src, dst)
+
+    def _bidirectional_dijkstra(self, src: int, dst: int) -> ():
+        """
+        Helper method for shortest_path() without a heuristic. Only touches the vertices the two searches reach, so
+        the cost of a query does not depend on the size of the graph
+        """
+        store = self._store()
+        inf = float('inf')
+        distances = ({src: 0}, {dst: 0})  # forward and backward tentative distances
+        parents = ({src: -1}, {dst: -1})  # forward predecessors and backward successors
+        queues = ([(0, src)], [(0, dst)])
+        neighbors = (store.successors, store.predecessors)
+        best, meet = inf, -1
+        while len(queues[0]) > 0 and len(queues[1]) > 0:
+            if queues[0][0][0] + queues[1][0][0] >= best:  # no unfinished path can beat the best meeting point
+                break
+            side = 0 if queues[0][0][0] <= queues[1][0][0] else 1  # grow the search with the closer frontier
+            dist, other = distances[side], distances[1 - side]
+            d, v = heapq.heappop(queues[side])
+            if d > dist[v]:  # stale entry
+                continue
+            for x, weight in neighbors[side](v):
+                if d + weight < dist.get(x, inf):
+                    dist[x] = d + weight
+                    parents[side][x] = v
+                    heapq.heappush(queues[side], (d + weight, x))
+                    if x in other and d + weight + other[x] < best:  # the searches meet at x
+                        best, meet = d + weight + other[x], x
+        if meet == -1:
+            return inf, []
+        path = [meet]
+        while parents[0][path[-1]] != -1:  # walk back to src
+            path.append(parents[0][path[-1]])
+        path.reverse()
+        while parents[1][path[-1]] != -1:  # walk forward to dst
+            path.append(parents[1][path[-1]])
+        return best, path
+
+    def _a_star(self, src: int, dst: int, heuristic) -> ():
+        """
+        Helper method for shortest_path() with a heuristic. Vertices are popped in order of distance plus heuristic,
+        and a vertex is expanded again if a shorter path to it turns up, so any admissible heuristic gives exact
+        results
+        """
+        store = self._store()
+        inf = float('inf')
+        distances = {src: 0}
+        predecessors = {src: -1}
+        priority_queue = [(heuristic(src), 0, src)]  # estimated total, distance so far, vertex
+        while len(priority_queue) > 0:
+            _, d, v = heapq.heappop(priority_queue)
+            if d > distances[v]:  # stale entry
+                continue
+            if v == dst:
+                path = [dst]
+                while predecessors[path[-1]] != -1:
+                    path.append(predecessors[path[-1]])
+                path.reverse()
+                return d, path
+            for x, weight in store.successors(v):
+                if d + weight < distances.get(x, inf):
+                    estimate = heuristic(x)
+                    if estimate == inf:  # the heuristic proves dst cannot be reached from x
+                        continue
+                    distances[x] = d + weight
+                    predecessors[x] = v
+                    heapq.heappush(priority_queue, (d + weight + estimate, d + weight, x))
+        return inf, []
+
+    def reconstruct_path(self, predecessors: [], src: int, dst: int) -> []:
+        """
+        Takes a predecessor list from shortest_path_tree() and returns the shortest path from src to dst as a list of
+        vertices, or an empty list if dst was not reached
+        """
+        if dst < 0 or dst > len(predecessors)-1:
+            return []
+        path = [dst]
+        while path[-1] != src and predecessors[path[-1]] != -1:
+            path.append(predecessors[path[-1]])
+        if path[-1] != src:
+            return []
+        path.reverse()
+        return path
+
+
+class FrozenDirectedGraph(DirectedGraph):
+    """
+    Read-only DirectedGraph returned by DirectedGraph.snapshot(). Every query works as on the graph it was taken
+    from, the mutating methods raise TypeError
+    """
+
+    def _read_only(self, *args, **kwargs):
+        """
+        Stands in for every method that would edit the graph
+        """
+        raise TypeError('graph snapshots are read-only')
+
+    add_vertex = new_vertex = remove_vertex = add_edge = try_add_edge = remove_edge = set_weights = compact = _read_only
+
+    def snapshot(self):
+        """
+        Returns the snapshot itself, which already never changes
+        """
+        return self
+
+
+_worker_memory = None  # shared memory block attached by each process pool worker, see _init_worker()
+_worker_graph = None  # read-only graph over that block
+
+
+def _init_worker(name: str) -> None:
+    """
+    Process pool initializer, attaches the shared memory block holding a graph snapshot and builds a graph that
+    reads its columns in place
+    """
+    global _worker_memory, _worker_graph
+    _worker_memory = shared_memory.SharedMemory(name=name)  # the parent owns the block and unlinks it
+    _worker_graph = DirectedGraph._from_snapshot(_worker_memory.buf, False)
+
+
+def _worker_rows(task: ()) -> ():
+    """
+    Process pool task, takes (src, with_predecessors) and returns the distance row (float32) and, if asked for, the
+    predecessor row (int32) for src
+    """
+    src, with_predecessors = task
+    distances, predecessors = _worker_graph.shortest_path_tree(src)
+    return array('f', distances), array('i', predecessors) if with_predecessors else None
 
 
 if __name__ == '__main__':
@@ -0,0 +1,221 @@
+# Course: CS261 - Data Structures
+# Author: Kyle Brogdon
+# Assignment: Assignment 6 Graphs
+# Description: Level-synchronous breadth first search shared by DirectedGraph and UndirectedGraph. The graph is
+# given as CSR arrays over integer vertex ids and each step expands the whole frontier at once, either top-down
+# (frontier -> unvisited successors) or bottom-up (unvisited vertex -> any predecessor in the frontier). With a process
+# pool, large steps are split between workers that read the arrays and the level state from shared memory.
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+ALPHA = 14  # go bottom-up once the frontier holds more than 1 / ALPHA of the unvisited vertices
+BETA = 24  # go back to top-down once the frontier holds less than 1 / BETA of all vertices
+PARALLEL_MIN = 4096  # smallest step (frontier size or vertex count) that is split between worker processes
+
+DIRECTIONS = ('auto', 'top-down', 'bottom-up')
+
+
+def _padded(offsets, n: int):
+    """
+    Returns offsets extended to n + 1 entries, rows past the end of the packed arrays being empty
+    """
+    if len(offsets) > n:
+        return offsets
+    offsets = array('q', offsets)
+    offsets.extend([offsets[-1]] * (n + 1 - len(offsets)))
+    return offsets
+
+
+def _top_down(offsets, targets, visited, frontier, lo: int, hi: int) -> ():
+    """
+    Expands frontier[lo:hi], returns (children, parents) arrays of the unvisited vertices found, each listed once with
+    the first frontier vertex that reached it
+    """
+    found = dict()
+    for i in range(lo, hi):
+        u = frontier[i]
+        for j in range(offsets[u], offsets[u + 1]):
+            v = targets[j]
+            if not visited[v] and v not in found:
+                found[v] = u
+    return array('q', found.keys()), array('q', found.values())
+
+
+def _bottom_up(in_offsets, in_sources, visited, in_frontier, lo: int, hi: int) -> ():
+    """
+    Checks the unvisited vertices in range(lo, hi), returns (children, parents) arrays of those with a predecessor in
+    the frontier (the smallest such predecessor, since the reverse rows are sorted)
+    """
+    children, parents = array('q'), array('q')
+    for v in range(lo, hi):
+        if not visited[v]:
+            for j in range(in_offsets[v], in_offsets[v + 1]):
+                u = in_sources[j]
+                if in_frontier[u]:
+                    children.append(v)
+                    parents.append(u)
+                    break
+    return children, parents
+
+
+def _chunks(count: int, parts: int) -> []:
+    """
+    Returns up to parts (lo, hi) ranges covering range(count) in order
+    """
+    size = -(-count // parts)
+    return [(lo, min(count, lo + size)) for lo in range(0, count, size)]
+
+
+def level_bfs(n: int, forward: (), reverse, src: int, direction='auto', workers=None) -> ():
+    """
+    Takes the vertex count, the forward CSR arrays (offsets, targets), a function returning the reverse CSR arrays
+    (offsets, sources) with sorted rows, the source vertex, the direction ('auto', 'top-down' or 'bottom-up') and the
+    number of worker processes. reverse is only called when a bottom-up step is taken. 'auto' starts top-down and
+    switches per level with the usual direction-optimizing rule, using vertex counts in place of edge counts. With
+    workers > 1, steps of at least PARALLEL_MIN vertices are split between a process pool. Returns (hops, parents) as
+    int64 arrays indexed by vertex, -1 for unreached vertices and for the parent of src
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"unknown direction '{direction}', expected 'auto', 'top-down' or 'bottom-up'")
+    hops = array('q', [-1]) * n
+    parents = array('q', [-1]) * n
+    if not 0 <= src < n:
+        return hops, parents
+    offsets, targets = _padded(forward[0], n), forward[1]
+    backward = None
+    hops[src] = 0
+    visited = bytearray(n)
+    visited[src] = 1
+    frontier = array('q', [src])
+    unvisited = n - 1
+    bottom_up = direction == 'bottom-up'
+    pool = None
+    if workers is not None and workers > 1 and n >= PARALLEL_MIN:
+        if direction != 'top-down':  # the workers need the reverse arrays before the first bottom-up step
+            in_offsets, in_sources = reverse()
+            backward = _padded(in_offsets, n), in_sources
+        pool = _FrontierPool(n, (offsets, targets) + (backward or ()), workers)
+    try:
+        level = 0
+        while len(frontier) > 0:
+            level += 1
+            if direction == 'auto':
+                if not bottom_up and len(frontier) * ALPHA > unvisited:
+                    bottom_up = True
+                elif bottom_up and len(frontier) * BETA < n:
+                    bottom_up = False
+            if bottom_up:
+                if backward is None:
+                    in_offsets, in_sources = reverse()
+                    backward = _padded(in_offsets, n), in_sources
+                in_frontier = bytearray(n)
+                for u in frontier:
+                    in_frontier[u] = 1
+                if pool is not None:
+                    steps = pool.bottom_up(visited, in_frontier)
+                else:
+                    steps = [_bottom_up(backward[0], backward[1], visited, in_frontier, 0, n)]
+            elif pool is not None and len(frontier) >= PARALLEL_MIN:
+                steps = pool.top_down(visited, frontier)
+            else:
+                steps = [_top_down(offsets, targets, visited, frontier, 0, len(frontier))]
+            frontier = array('q')
+            for children, found_from in steps:  # chunks come back in order, so the first parent found wins
+                for i in range(len(children)):
+                    v = children[i]
+                    if not visited[v]:
+                        visited[v] = 1
+                        hops[v] = level
+                        parents[v] = found_from[i]
+                        frontier.append(v)
+            unvisited -= len(frontier)
+    finally:
+        if pool is not None:
+            pool.close()
+    return hops, parents
+
+
+_worker_blocks = []  # shared memory blocks attached by each pool worker, see _attach()
+_worker_arrays = None  # offsets, targets and (when shared) in_offsets, in_sources as int64 views
+_worker_state = None  # (visited, in_frontier, frontier) views into the level state block
+
+
+def _attach(graph_name: str, lengths: [], state_name: str, n: int) -> None:
+    """
+    Process pool initializer, attaches the block holding the CSR arrays (int64, back to back, with the given lengths)
+    and the level state block (the int64 frontier followed by the visited and in_frontier bytes)
+    """
+    global _worker_arrays, _worker_state
+    graph = shared_memory.SharedMemory(name=graph_name)  # the parent owns both blocks and unlinks them
+    state = shared_memory.SharedMemory(name=state_name)
+    _worker_blocks.extend((graph, state))
+    _worker_arrays = []
+    offset = 0
+    for length in lengths:
+        _worker_arrays.append(graph.buf[offset:offset + 8 * length].cast('q'))
+        offset += 8 * length
+    _worker_state = state.buf[8 * n:9 * n], state.buf[9 * n:10 * n], state.buf[0:8 * n].cast('q')
+
+
+def _worker_step(task: ()) -> ():
+    """
+    Process pool task, takes (kind, lo, hi) and runs the top-down or bottom-up step on that slice of the level
+    """
+    kind, lo, hi = task
+    visited, in_frontier, frontier = _worker_state
+    if kind == 'down':
+        return _top_down(_worker_arrays[0], _worker_arrays[1], visited, frontier, lo, hi)
+    return _bottom_up(_worker_arrays[2], _worker_arrays[3], visited, in_frontier, lo, hi)
+
+
+class _FrontierPool:
+    """
+    Process pool plus the two shared memory blocks it works on. Before each parallel step the parent copies the
+    visited bitmap and the frontier into the state block, then hands each worker a slice of the step
+    """
+
+    def __init__(self, n: int, arrays: (), workers: int):
+        """
+        Takes the vertex count, the CSR arrays to share (forward, then optionally reverse) and the number of workers
+        """
+        self.n = n
+        self.workers = workers
+        parts = [memoryview(column).cast('B') for column in arrays]
+        self.graph = shared_memory.SharedMemory(create=True, size=max(8, sum(len(part) for part in parts)))
+        self.state = shared_memory.SharedMemory(create=True, size=10 * n)
+        offset = 0
+        for part in parts:
+            self.graph.buf[offset:offset + len(part)] = part
+            offset += len(part)
+        self.pool = ProcessPoolExecutor(workers, initializer=_attach,
+                                        initargs=(self.graph.name, [len(column) for column in arrays],
+                                                  self.state.name, n))
+
+    def top_down(self, visited: bytearray, frontier: array) -> []:
+        """
+        Expands the frontier in parallel, returns the (children, parents) of each chunk in frontier order
+        """
+        self.state.buf[0:8 * len(frontier)] = frontier.tobytes()
+        self.state.buf[8 * self.n:9 * self.n] = visited
+        tasks = [('down', lo, hi) for lo, hi in _chunks(len(frontier), self.workers * 4)]
+        return list(self.pool.map(_worker_step, tasks))
+
+    def bottom_up(self, visited: bytearray, in_frontier: bytearray) -> []:
+        """
+        Checks every unvisited vertex in parallel, returns the (children, parents) of each vertex range in order
+        """
+        self.state.buf[8 * self.n:9 * self.n] = visited
+        self.state.buf[9 * self.n:10 * self.n] = in_frontier
+        tasks = [('up', lo, hi) for lo, hi in _chunks(self.n, self.workers * 4)]
+        return list(self.pool.map(_worker_step, tasks))
+
+    def close(self) -> None:
+        """
+        Shuts the workers down and frees both shared memory blocks
+        """
+        self.pool.shutdown()
+        for block in (self.graph, self.state):
+            block.close()
+            block.unlink()
@@ -0,0 +1,247 @@
+# Course: CS261 - Data Structures
+# Author: Kyle Brogdon
+# Assignment: Assignment 6 Graphs
+# Description: Edge file formats shared by DirectedGraph and UndirectedGraph. Text files hold one edge per line
+# (CSV or tab/space separated), binary edge files hold the edges as packed columns so they can be read with one copy
+# per column straight out of a memory map. Also the helpers for the graph snapshot files written by save(), whose
+# 8 byte aligned columns can be used in place from a memory map.
+
+import mmap
+import os
+import struct
+from array import array
+from contextlib import contextmanager
+
+EDGE_MAGIC = b'GEDG'
+EDGE_VERSION = 1
+EDGE_HEADER = '<4sIIq'  # magic, version, flags, edge count
+WEIGHTED = 1  # a weight column follows the source and destination columns
+FLOAT_WEIGHTS = 2  # the weight column holds doubles instead of 64 bit integers
+NAMED = 4  # a vertex name table follows the columns, vertex ids index into it
+
+BINARY_SUFFIXES = ('.bin', '.edges')
+HEADER_NAMES = frozenset(('u', 'v', 'w', 'src', 'dst', 'source', 'target', 'destination', 'from', 'to', 'weight',
+                          'node', 'vertex', 'node1', 'node2', 'vertex1', 'vertex2', 'head', 'tail'))
+
+
+def edge_format(path: str, fmt=None) -> str:
+    """
+    Takes a file path and an optional explicit format and returns 'csv', 'tsv' or 'binary', guessing from the file
+    suffix when no format is given (anything that is not .csv or a binary suffix is read as tab/space separated)
+    """
+    if fmt is not None:
+        if fmt not in ('csv', 'tsv', 'binary'):
+            raise ValueError(f"unknown edge file format '{fmt}', expected 'csv', 'tsv' or 'binary'")
+        return fmt
+    lower = path.lower()
+    if lower.endswith('.csv'):
+        return 'csv'
+    if lower.endswith(BINARY_SUFFIXES):
+        return 'binary'
+    return 'tsv'
+
+
+def _number(text: str):
+    """
+    Parses an int if possible, otherwise a float
+    """
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _is_header(fields: []) -> bool:
+    """
+    Returns True if the first two fields of a line are both usual column names (see HEADER_NAMES), which is how a
+    header is told apart from an edge when vertex names are arbitrary strings
+    """
+    return all(field.strip().decode().lower() in HEADER_NAMES for field in fields[:2])
+
+
+def iter_text_edges(path: str, fmt='csv', weighted=True, numeric=True, header=None):
+    """
+    Generator over the edges of a text file read through a memory map. Each line is 'u,v[,weight]' for csv or
+    whitespace separated for tsv, and blank lines and lines starting with '#' are skipped. Yields (u, v, weight) with
+    weight 1 when missing if weighted is True, otherwise (u, v). Vertices are converted to int when numeric is True
+    and kept as strings otherwise. header tells whether the first line is a header to skip; by default it is guessed:
+    a first line that does not parse is a header, and so is one whose first two fields are both column names like
+    'u,v' or 'source,target' (the only check possible when vertex names are strings)
+    """
+    separator = b',' if fmt == 'csv' else None
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:  # an empty file cannot be memory mapped
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            first = True
+            for line in iter(buffer.readline, b''):
+                fields = line.split(separator)
+                if len(fields) < 2 or fields[0].startswith(b'#') or len(fields[0].strip()) == 0:
+                    continue
+                if first and (header or header is None and _is_header(fields)):
+                    first = False
+                    continue
+                u, v = fields[0].strip().decode(), fields[1].strip().decode()
+                try:
+                    if numeric:
+                        u, v = int(u), int(v)
+                    weight = _number(fields[2].strip().decode()) if weighted and len(fields) > 2 else 1
+                except ValueError:
+                    if first and header is None:  # header line
+                        first = False
+                        continue
+                    raise
+                first = False
+                yield (u, v, weight) if weighted else (u, v)
+
+
+def read_edge_columns(path: str) -> ():
+    """
+    Reads a binary edge file and returns (sources, destinations, weights, names): int64 arrays of vertex ids, an
+    int64 or double array of weights (None for an unweighted file) and a list of vertex names (None without a name
+    table). Each column is copied out of the memory map in one piece
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            magic, version, flags, count = struct.unpack_from(EDGE_HEADER, buffer, 0)
+            if magic != EDGE_MAGIC or version != EDGE_VERSION:
+                raise ValueError(f'{path} is not a version {EDGE_VERSION} binary edge file')
+            offset = struct.calcsize(EDGE_HEADER)
+            columns = []
+            typecodes = ['q', 'q']
+            if flags & WEIGHTED:
+                typecodes.append('d' if flags & FLOAT_WEIGHTS else 'q')
+            for typecode in typecodes:
+                column = array(typecode)
+                column.frombytes(buffer[offset:offset + count * column.itemsize])
+                offset += count * column.itemsize
+                columns.append(column)
+            names = None
+            if flags & NAMED:
+                names, offset = read_name_table(buffer, offset)
+    weights = columns[2] if flags & WEIGHTED else None
+    return columns[0], columns[1], weights, names
+
+
+def write_edge_file(path: str, edges, weighted=True) -> None:
+    """
+    Takes an iterable of (u, v, weight) tuples (or (u, v) pairs when weighted is False) and writes a binary edge
+    file. Integer vertices are stored as they are, any other vertex names are numbered in order of appearance and
+    saved in a name table
+    """
+    sources, destinations, weights = array('q'), array('q'), []
+    ids = dict()
+    names = []
+    edges = list(edges)
+    numeric = all(type(edge[0]) is int and type(edge[1]) is int for edge in edges)
+    for edge in edges:
+        pair = []
+        for v in edge[:2]:
+            if not numeric:  # intern names as dense ids
+                if v not in ids:
+                    ids[v] = len(names)
+                    names.append(str(v))
+                v = ids[v]
+            pair.append(v)
+        sources.append(pair[0])
+        destinations.append(pair[1])
+        if weighted:
+            weights.append(edge[2] if len(edge) > 2 else 1)
+    flags = 0
+    if weighted:
+        flags |= WEIGHTED
+        try:
+            weights = array('q', weights)
+        except (TypeError, OverflowError):
+            weights = array('d', weights)
+            flags |= FLOAT_WEIGHTS
+    if not numeric:
+        flags |= NAMED
+    with atomic_write(path) as f:
+        f.write(struct.pack(EDGE_HEADER, EDGE_MAGIC, EDGE_VERSION, flags, len(sources)))
+        sources.tofile(f)
+        destinations.tofile(f)
+        if weighted:
+            weights.tofile(f)
+        if not numeric:
+            f.write(name_table(names))
+
+
+def name_table(names: []) -> bytes:
+    """
+    Packs a list of strings as a name count, count + 1 int64 byte offsets and the UTF-8 encoded names back to back
+    """
+    encoded = [name.encode() for name in names]
+    offsets = array('q', [0])
+    for name in encoded:
+        offsets.append(offsets[-1] + len(name))
+    return struct.pack('<q', len(names)) + offsets.tobytes() + b''.join(encoded)
+
+
+def read_name_table(buffer, offset: int) -> ():
+    """
+    Reads a name table written by name_table() starting at offset in buffer, returns (names, offset past the end)
+    """
+    count, = struct.unpack_from('<q', buffer, offset)
+    offset += 8
+    offsets = array('q')
+    offsets.frombytes(buffer[offset:offset + (count + 1) * 8])
+    offset += (count + 1) * 8
+    blob = bytes(buffer[offset:offset + offsets[-1]])
+    names = [blob[offsets[i]:offsets[i + 1]].decode() for i in range(count)]
+    return names, offset + offsets[-1]
+
+
+def padding(offset: int) -> bytes:
+    """
+    Returns the zero bytes needed to move offset up to the next multiple of 8
+    """
+    return b'\0' * (-offset % 8)
+
+
+def open_buffer(path: str, use_mmap=True) -> memoryview:
+    """
+    Returns a read-only memoryview of a whole file, memory mapped when use_mmap is True (pages are loaded on first
+    touch and shared between every process mapping the same file) or read into memory otherwise
+    """
+    with open(path, 'rb') as f:
+        if not use_mmap:
+            return memoryview(f.read())
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+@contextmanager
+def atomic_write(path: str):
+    """
+    Opens a temporary file next to path for binary writing and, once the with block finishes without an error, moves
+    it over path with one os.replace(). Readers never see a half written file, a failed write leaves the old file as
+    it was, and a graph still memory mapping the old file keeps reading its pages because the file is replaced, not
+    truncated
+    """
+    temp = f'{path}.{os.getpid()}.{os.urandom(4).hex()}.tmp'
+    f = os.fdopen(os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666), 'wb')
+    try:
+        with f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())  # the data must be on disk before the rename makes it the file at path
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def take_column(buffer: memoryview, offset: int, typecode: str, count: int, copy=False) -> ():
+    """
+    Takes a buffer, a byte offset (rounded up to a multiple of 8), an array typecode and an item count and returns
+    (column, offset past the column). The column is a typed view into the buffer, or a copy in an array when copy is
+    True
+    """
+    offset += -offset % 8
+    size = array(typecode).itemsize * count
+    if copy:
+        column = array(typecode)
+        column.frombytes(buffer[offset:offset + size])
+    else:
+        column = buffer[offset:offset + size].cast(typecode)
+    return column, offset + size
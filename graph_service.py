@@ -0,0 +1,118 @@
+# Course: CS261 - Data Structures
+# Author: Kyle Brogdon
+# Assignment: Assignment 6 Graphs
+# Description: asyncio front end for DirectedGraph and UndirectedGraph. Queries run against a snapshot() of the graph,
+# so the owner can keep editing it from the event loop while queries are in flight. Traversals run on the loop in
+# chunks that yield between them, the heavier queries go to a bounded thread pool, and identical queries that are in
+# flight at the same time on the same snapshot share one computation.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK = 1024  # vertices a traversal yields before handing control back to the event loop
+
+
+class GraphService:
+    """
+    Async facade over a graph. dfs() and bfs() step the generator versions (iter_dfs / iter_bfs) on the event loop,
+    yielding every chunk vertices, so a long traversal never holds the loop for more than one chunk. dijkstra(),
+    has_cycle() and count_connected_components() run whole in a pool of worker threads, at most workers at a time;
+    further calls wait on the loop for a free worker. A query with the same method and arguments as one already in
+    flight on the current snapshot awaits that one instead of starting another. Each caller gets its own copy of a
+    list result
+    """
+
+    def __init__(self, graph, workers=4, chunk=CHUNK):
+        """
+        Takes the graph to serve (a DirectedGraph or an UndirectedGraph, which the caller keeps editing as usual),
+        the number of worker threads and the number of vertices a traversal visits between yields
+        """
+        self.graph = graph
+        self.chunk = chunk
+        self.pool = ThreadPoolExecutor(workers)
+        self.slots = asyncio.Semaphore(workers)  # callers past the pool size wait here, not in the pool queue
+        self.in_flight = dict()  # (snapshot, method, args) -> task computing the result
+        self._snapshot = None
+        self._generation = None  # graph.generation when _snapshot was taken
+
+    def snapshot(self):
+        """
+        Returns the snapshot queries run against. A new one is only taken once the graph was edited since the last,
+        which the edit counter of the graph (its generation property) tells
+        """
+        generation = self.graph.generation
+        if self._snapshot is None or generation != self._generation:
+            self._snapshot = self.graph.snapshot()
+            self._generation = generation
+        return self._snapshot
+
+    async def dfs(self, v_start, v_end=None) -> []:
+        """
+        Takes the same arguments as the graph's dfs() and returns the same list, visited in chunks on the event loop
+        """
+        return await self._query('iter_dfs', (v_start, v_end), self._traverse)
+
+    async def bfs(self, v_start, v_end=None) -> []:
+        """
+        Takes the same arguments as the graph's bfs() and returns the same list, visited in chunks on the event loop
+        """
+        return await self._query('iter_bfs', (v_start, v_end), self._traverse)
+
+    async def dijkstra(self, src: int) -> []:
+        """
+        Takes a source vertex and returns the graph's dijkstra(src), computed in a worker thread (DirectedGraph only)
+        """
+        return await self._query('dijkstra', (src,), self._offload)
+
+    async def has_cycle(self) -> bool:
+        """
+        Returns the graph's has_cycle(), computed in a worker thread
+        """
+        return await self._query('has_cycle', (), self._offload)
+
+    async def count_connected_components(self) -> int:
+        """
+        Returns the graph's count_connected_components(), computed in a worker thread (UndirectedGraph only)
+        """
+        return await self._query('count_connected_components', (), self._offload)
+
+    async def _query(self, method: str, args: (), run):
+        """
+        Takes a method name of the snapshot, its arguments and the coroutine function that runs it, and returns the
+        result, joining the identical query on the same snapshot if one is in flight. The shared task is shielded, so
+        a caller that gets cancelled does not cancel it for the others
+        """
+        snapshot = self.snapshot()
+        key = (snapshot, method, args)
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run(getattr(snapshot, method), args))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        result = await asyncio.shield(task)
+        return list(result) if isinstance(result, list) else result
+
+    async def _traverse(self, generator, args: ()) -> []:
+        """
+        Takes a generator method and its arguments and collects what it yields, giving the event loop a turn after
+        every chunk vertices
+        """
+        visited = []
+        for v in generator(*args):
+            visited.append(v)
+            if len(visited) % self.chunk == 0:
+                await asyncio.sleep(0)
+        return visited
+
+    async def _offload(self, function, args: ()):
+        """
+        Takes a method and its arguments and runs it in the worker pool once a worker is free
+        """
+        async with self.slots:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, function, *args)
+
+    def close(self) -> None:
+        """
+        Waits for the queries already running in the pool and shuts the worker threads down
+        """
+        self.pool.shutdown()
@@ -0,0 +1,289 @@
+# Course: CS261 - Data Structures
+# Author: Kyle Brogdon
+# Assignment: Assignment 6 Directed Graphs
+# Description: pytest checks for DirectedGraph. The randomized tests replay the same edits on the graph and on a
+# reference {vertex: {successor: weight}} dict and compare the two after every step.
+
+import copy
+import heapq
+import random
+
+import pytest
+
+from d_graph import DirectedGraph, np
+
+STORAGES = ('dense', 'csr') + (('numpy',) if np is not None else ())
+
+
+def reference_distances(ref: dict, src: int, n: int) -> []:
+    """
+    Returns the Dijkstra distances from src over a reference dict, inf for unreached slots
+    """
+    dist = [float('inf')] * n
+    if src not in ref:
+        return dist
+    dist[src] = 0
+    heap = [(0, src)]
+    while len(heap) > 0:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for v, w in ref[u].items():
+            if d + w < dist[v]:
+                dist[v] = d + w
+                heapq.heappush(heap, (d + w, v))
+    return dist
+
+
+def check_against(g, ref: dict, n: int) -> None:
+    """
+    Asserts that graph g holds exactly the vertices and edges of the reference dict over n vertex slots
+    """
+    assert g.v_count == n
+    assert g.get_vertices() == sorted(ref)
+    expected = sorted((u, v, w) for u in ref for v, w in ref[u].items())
+    assert sorted(g.get_edges()) == expected
+    for src in list(ref)[:3]:
+        assert g.dijkstra(src) == reference_distances(ref, src, n)
+
+
+def random_edit(g, ref: dict, free: [], rng: random.Random, n: int) -> int:
+    """
+    Applies one random edit to g and to the reference dict (free lists the removed ids in the order they were
+    removed), returns the new number of vertex slots
+    """
+    op = rng.random()
+    u, v = rng.randrange(max(n, 1)), rng.randrange(max(n, 1))  # after compact() removed every vertex, n is 0
+    if op < 0.5:
+        weight = rng.choice([1, 2, 7, 0, 2.5])
+        g.add_edge(u, v, weight)
+        if u != v and u in ref and v in ref:
+            if weight > 0:
+                ref[u][v] = weight
+            else:
+                ref[u].pop(v, None)
+    elif op < 0.75:
+        g.remove_edge(u, v)
+        if u in ref:
+            ref[u].pop(v, None)
+    elif op < 0.85:
+        g.add_vertex()
+        if len(free) > 0:  # the most recently freed id is reused first
+            ref[free.pop()] = dict()
+        else:
+            ref[n] = dict()
+            n += 1
+    elif op < 0.97:
+        g.remove_vertex(u)
+        if u in ref:
+            del ref[u]
+            free.append(u)
+            for row in ref.values():
+                row.pop(u, None)
+    else:
+        mapping = g.compact()
+        assert mapping == {old: new for new, old in enumerate(sorted(ref))}
+        ref.update({mapping[x]: {mapping[y]: w for y, w in ref.pop(x).items()} for x in sorted(ref)})
+        free.clear()
+        n = len(ref)
+    return n
+
+
+def test_save_load_after_add_vertex(tmp_path):
+    """
+    A packed CSR graph that gained vertices after packing writes one offset per vertex slot
+    """
+    for storage in STORAGES:
+        g = DirectedGraph.from_edge_stream([(0, 1, 5), (1, 2, 3)], storage=storage)
+        g.add_vertex()
+        g.save(str(tmp_path / f'{storage}-a.snap'))
+        for mmap in (True, False):
+            loaded = DirectedGraph.load(str(tmp_path / f'{storage}-a.snap'), mmap)
+            assert loaded.v_count == 4
+            assert loaded.get_edges() == [(0, 1, 5), (1, 2, 3)]
+        g.add_edge(3, 0, 7)
+        g.add_vertex()
+        g.save(str(tmp_path / f'{storage}-b.snap'))
+        loaded = DirectedGraph.load(str(tmp_path / f'{storage}-b.snap'))
+        assert loaded.v_count == 5
+        assert loaded.get_edges() == [(0, 1, 5), (1, 2, 3), (3, 0, 7)]
+
+
+@pytest.mark.parametrize('storage', STORAGES)
+def test_snapshots_never_change(storage):
+    """
+    Snapshots taken between random edits (compact() included) keep answering from the state they were taken in,
+    while the live graph matches the reference after every edit
+    """
+    rng = random.Random(24)
+    for _ in range(20):
+        n = rng.randint(2, 12)
+        edges = [(rng.randrange(n), rng.randrange(n), rng.randint(1, 9)) for _ in range(2 * n)]
+        edges.append((n - 1, 0, rng.choice([0, 4])))  # makes sure every vertex slot exists
+        g = DirectedGraph.from_edge_stream(edges, storage=storage)
+        ref = {u: dict() for u in range(n)}
+        for u, v, w in edges:
+            if u != v:
+                ref[u][v] = w
+                if w <= 0:
+                    del ref[u][v]
+        snapshots = []
+        free = []
+        for _ in range(30):
+            if rng.random() < 0.3:
+                snapshots.append((g.snapshot(), copy.deepcopy(ref), n))
+            n = random_edit(g, ref, free, rng, n)
+            check_against(g, ref, n)
+            for snapshot, frozen, count in snapshots:
+                check_against(snapshot, frozen, count)
+        with pytest.raises(TypeError):
+            g.snapshot().add_edge(0, 1)
+
+
+@pytest.mark.parametrize('storage', STORAGES)
+def test_removed_vertices_are_missing(storage):
+    """
+    Shortest path queries treat a removed vertex like one that was never added, and new_vertex() hands out its id
+    """
+    g = DirectedGraph.from_edge_stream([(0, 1, 1), (1, 2, 1), (0, 2, 5), (2, 3, 1)], storage=storage)
+    g.remove_vertex(1)
+    inf = float('inf')
+    assert g.dijkstra(1) == [inf] * 4
+    assert g.dijkstra(0) == [0, inf, 5, 6]
+    assert g.shortest_path(1, 1) == (inf, [])
+    assert g.shortest_path(0, 1) == (inf, [])
+    assert g.shortest_path(0, 3) == (6, [0, 2, 3])
+    assert g.multi_source_dijkstra([1, 2]) == ([inf, inf, 0, 1], [-1, -1, 2, 2])
+    assert g.new_vertex() == 1
+    assert g.dijkstra(1) == [inf, 0, inf, inf]
+    assert g.new_vertex() == 4
+    assert g.add_vertex() == 6
+    assert g.v_count == 6
+
+
+@pytest.mark.parametrize('storage', ['dense', 'csr'])
+def test_weights_keep_their_type(storage, monkeypatch):
+    """
+    Random edits with a mix of integer and float weights, with the CSR delta buffer compacted every few edits and the
+    graph moved between backends now and then, keep every weight as the exact value and type it was stored with
+    """
+    monkeypatch.setattr('d_graph._CSRStorage.min_delta', 2)
+    rng = random.Random(1)
+    for _ in range(20):
+        n = rng.randint(2, 10)
+        edges = [(rng.randrange(n), rng.randrange(n), rng.choice([3, 1.5])) for _ in range(2 * n)]
+        edges.append((n - 1, 0, rng.choice([0, 4])))
+        g = DirectedGraph.from_edge_stream(edges, storage=storage)
+        ref = {u: dict() for u in range(n)}
+        for u, v, w in edges:
+            if u != v:
+                ref[u][v] = w
+                if w <= 0:
+                    del ref[u][v]
+        free = []
+        for _ in range(40):
+            n = random_edit(g, ref, free, rng, n)
+            if rng.random() < 0.1:
+                g.set_storage(rng.choice(['dense', 'csr']))
+            check_against(g, ref, n)
+            expected = sorted((u, v, w, type(w).__name__) for u in ref for v, w in ref[u].items())
+            assert sorted((u, v, w, type(w).__name__) for u, v, w in g.get_edges()) == expected
+
+
+@pytest.mark.skipif(np is None, reason='needs numpy')
+def test_numpy_set_weights_keeps_integer_matrix():
+    """
+    A batch with no weights, or with float weights that are all whole numbers, leaves an integer matrix integer
+    """
+    g = DirectedGraph.from_edge_stream([(0, 1, 5), (1, 2, 3)], storage='numpy')
+    g.set_weights([], [], [])
+    g.set_weights(np.array([0, 0]), np.array([1, 2]), np.array([0.0, 4.0]))
+    assert g.get_edges() == [(0, 2, 4), (1, 2, 3)]
+    assert type(g.get_edges()[0][2]) is int
+    g.set_weights([2], [0], [1.5])
+    assert g.get_edges() == [(0, 2, 4.0), (1, 2, 3.0), (2, 0, 1.5)]
+
+
+def test_save_over_mapped_file(tmp_path):
+    """
+    Saving over the file a graph was memory mapped from replaces the file instead of rewriting it, so the loaded
+    graph keeps reading its old edges
+    """
+    path = str(tmp_path / 'g.snap')
+    DirectedGraph.from_edge_stream([(0, 1, 5), (1, 2, 3)]).save(path)
+    loaded = DirectedGraph.load(path)
+    DirectedGraph.from_edge_stream([(2, 0, 1)]).save(path)
+    assert loaded.get_edges() == [(0, 1, 5), (1, 2, 3)]
+    assert DirectedGraph.load(path).get_edges() == [(2, 0, 1)]
+    assert list(tmp_path.iterdir()) == [tmp_path / 'g.snap']
+
+
+def reference_reaches(ref: dict, u: int, v: int) -> bool:
+    """
+    Returns True if v can be reached from u in a reference dict
+    """
+    seen = {u}
+    stack = [u]
+    while len(stack) > 0:
+        x = stack.pop()
+        if x == v:
+            return True
+        for y in ref[x]:
+            if y not in seen:
+                seen.add(y)
+                stack.append(y)
+    return False
+
+
+@pytest.mark.parametrize('storage', STORAGES)
+def test_maintained_topological_order(storage):
+    """
+    With the topological order maintained, random edits reject exactly the edges that would close a cycle, and the
+    maintained order stays valid for the reference edges after every edit
+    """
+    rng = random.Random(3)
+    for _ in range(20):
+        n = rng.randint(2, 10)
+        g = DirectedGraph.from_edge_stream([(n - 1, 0, 0)], storage=storage)
+        g.rejected_limit = 4
+        assert g.maintain_topological_order()
+        ref = {u: dict() for u in range(n)}
+        rejected = []
+        for _ in range(60):
+            op = rng.random()
+            u, v = rng.randrange(n), rng.randrange(n)
+            if op < 0.75:
+                weight = rng.choice([1, 3, 0])
+                closes_cycle = u != v and weight > 0 and v not in ref[u] and reference_reaches(ref, v, u)
+                assert g.try_add_edge(u, v, weight) == (u != v and not closes_cycle)
+                if closes_cycle:
+                    rejected.append((u, v, weight))
+                elif u != v and weight > 0:
+                    ref[u][v] = weight
+                elif u != v:
+                    ref[u].pop(v, None)
+            elif op < 0.95:
+                g.remove_edge(u, v)
+                ref[u].pop(v, None)
+            else:
+                assert g.new_vertex() == n
+                ref[n] = dict()
+                n += 1
+            order = g.topological_order()
+            assert sorted(order) == list(range(n))
+            position = {x: i for i, x in enumerate(order)}
+            assert all(position[x] < position[y] for x in ref for y in ref[x])
+            assert sorted(g.get_edges()) == sorted((x, y, w) for x in ref for y, w in ref[x].items())
+            assert list(g.rejected_edges) == rejected[-4:]
+
+
+def test_condensation_of_snapshot_is_editable():
+    """
+    The condensation of a snapshot is a new graph of its own, not another read-only snapshot
+    """
+    g = DirectedGraph.from_edge_stream([(0, 1, 2), (1, 0, 3), (1, 2, 4)])
+    condensed = g.snapshot().condensation()
+    assert type(condensed) is DirectedGraph
+    assert condensed.get_edges() == g.condensation().get_edges()
+    condensed.add_edge(1, 0, 1)
+    assert condensed.has_cycle()
@@ -0,0 +1,128 @@
+# Course: CS261 - Data Structures
+# Author: Kyle Brogdon
+# Assignment: Assignment 6 undirected Graphs
+# Description: pytest checks for UndirectedGraph. The randomized tests replay the same edits on the graph and on a
+# reference {vertex: [neighbors]} dict with the list semantics of the original implementation, and compare the two
+# after every step.
+
+import copy
+import random
+
+import pytest
+
+from graph_io import write_edge_file
+from ud_graph import UndirectedGraph
+
+NAMES = [chr(ord('A') + i) for i in range(12)]
+
+
+def reference_edit(ref: dict, op: str, u: str, v: str) -> None:
+    """
+    Applies add_vertex / add_edge / remove_edge / remove_vertex to the reference dict of neighbor lists
+    """
+    if op == 'add_vertex':
+        ref.setdefault(u, [])
+    elif op == 'add_edge' and u != v:
+        ref.setdefault(u, [])
+        ref.setdefault(v, [])
+        if v not in ref[u]:
+            ref[u].append(v)
+            ref[v].append(u)
+    elif op == 'remove_edge' and u in ref and v in ref and v in ref[u]:
+        ref[u].remove(v)
+        ref[v].remove(u)
+    elif op == 'remove_vertex' and u in ref:
+        for x in ref.pop(u):
+            ref[x].remove(u)
+
+
+def reference_components(ref: dict) -> int:
+    """
+    Returns the number of connected components of the reference dict
+    """
+    seen = set()
+    count = 0
+    for v in ref:
+        if v not in seen:
+            count += 1
+            seen.add(v)
+            stack = [v]
+            while len(stack) > 0:
+                for x in ref[stack.pop()]:
+                    if x not in seen:
+                        seen.add(x)
+                        stack.append(x)
+    return count
+
+
+def check_against(g, ref: dict) -> None:
+    """
+    Asserts that graph g holds the reference neighbor lists, in the same order, and agrees with it on edges and
+    components
+    """
+    assert list(g.adj_list) == list(ref)
+    assert {v: g.adj_list[v] for v in g.adj_list} == ref
+    assert g.edge_count == sum(len(row) for row in ref.values()) // 2
+    assert sorted(map(sorted, g.get_edges())) == sorted(sorted((u, v)) for u in ref for v in ref[u] if u < v)
+    assert g.count_connected_components() == reference_components(ref)
+
+
+@pytest.mark.parametrize('row_scan_limit', [2, 16])
+def test_snapshots_never_change(row_scan_limit):
+    """
+    Snapshots taken between random edits keep answering from the state they were taken in, while the live graph
+    matches the reference after every edit. A low row_scan_limit also runs the long (dict) row code paths
+    """
+    rng = random.Random(24)
+    ops = ['add_edge'] * 5 + ['remove_edge'] * 3 + ['add_vertex', 'remove_vertex']
+    for _ in range(30):
+        g = UndirectedGraph()
+        g.row_scan_limit = row_scan_limit
+        ref = dict()
+        snapshots = []
+        for _ in range(40):
+            if rng.random() < 0.3:
+                snapshots.append((g.snapshot(), copy.deepcopy(ref)))
+            op, u, v = rng.choice(ops), rng.choice(NAMES), rng.choice(NAMES)
+            getattr(g, op)(*((u,) if op.endswith('vertex') else (u, v)))
+            reference_edit(ref, op, u, v)
+            check_against(g, ref)
+            for snapshot, frozen in snapshots:
+                check_against(snapshot, frozen)
+        with pytest.raises(TypeError):
+            g.snapshot().add_edge('A', 'B')
+
+
+def test_save_rejects_non_str_names(tmp_path):
+    """
+    save() refuses vertex names it cannot store before writing anything, so an existing file stays as it was
+    """
+    path = str(tmp_path / 'g.snap')
+    g = UndirectedGraph([('A', 'B'), ('B', 'C')])
+    g.save(path)
+    g.add_edge('C', 4)
+    with pytest.raises(TypeError):
+        g.save(path)
+    assert UndirectedGraph.load(path).get_edges() == UndirectedGraph([('A', 'B'), ('B', 'C')]).get_edges()
+    assert list(tmp_path.iterdir()) == [tmp_path / 'g.snap']
+
+
+@pytest.mark.parametrize('named', [False, True])
+def test_binary_file_matches_edge_stream(tmp_path, named):
+    """
+    Loading a binary edge file gives the same graph, vertex order and neighbor order included, as passing its edges
+    to from_edge_stream()
+    """
+    rng = random.Random(13)
+    pool = NAMES[:6] + [1, '1'] if named else list(range(8))
+    path = str(tmp_path / 'g.edges')
+    for _ in range(50):
+        edges = [(rng.choice(pool), rng.choice(pool)) for _ in range(rng.randint(0, 30))]
+        write_edge_file(path, edges, weighted=False)
+        g = UndirectedGraph.from_file(path)
+        expected = UndirectedGraph.from_edge_stream((str(u), str(v)) for u, v in edges)
+        assert list(g.adj_list.items()) == list(expected.adj_list.items())
+        assert g.edge_count == expected.edge_count
+        g.add_edge('A', '7')
+        expected.add_edge('A', '7')
+        check_against(g, {v: expected.adj_list[v] for v in expected.adj_list})
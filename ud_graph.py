@@ -4,7 +4,109 @@
 # Description:
 
 import heapq
+import struct
+from array import array
 from collections import deque
+from collections.abc import Mapping
+
+from graph_bfs import level_bfs
+from graph_io import (atomic_write, edge_format, iter_text_edges, name_table, open_buffer, padding,
+                      read_edge_columns, read_name_table, take_column)
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only the vectorized binary file loader needs it
+    np = None
+
+
+def _first_seen(values) -> ():
+    """
+    Take a numpy array and return (distinct values in ascending order, index of each value in that array, position
+    where each distinct value first occurs)
+    """
+    found, inverse = np.unique(values, return_inverse=True)
+    inverse = inverse.ravel()
+    first = np.full(len(found), len(values), dtype=np.int64)
+    np.minimum.at(first, inverse, np.arange(len(values)))
+    return found, inverse, first
+
+
+class _AdjacencyView(Mapping):
+    """
+    Read-only stand-in for the adj_list dict: maps each vertex name, in insertion order, to the list of its neighbor
+    names. The graph keeps its edges as integer id rows (see UndirectedGraph.adj_list), so a neighbor list is built
+    from its row when it is accessed
+    """
+    __slots__ = ('graph',)
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, v) -> []:
+        graph = self.graph
+        return [graph._names[j] for j in graph._row(graph._ids[v])]
+
+    def __iter__(self):
+        return iter(self.graph._ids)
+
+    def __len__(self) -> int:
+        return len(self.graph._ids)
+
+    def __contains__(self, v) -> bool:
+        return v in self.graph._ids
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+
+class _DisjointSet:
+    """
+    Union-find over integer vertex ids with union by size and path halving, so each operation is nearly O(1). The
+    parent and size tables are int64 arrays indexed by id, -1 marking ids that are not in any set
+    """
+
+    def __init__(self):
+        self.parent = array('q')
+        self.size = array('q')
+        self.count = 0  # number of disjoint sets
+
+    def add(self, x: int) -> None:
+        """
+        Add x as a set of its own, if it is not already present
+        """
+        if x >= len(self.parent):
+            grow = x + 1 - len(self.parent)
+            self.parent.extend(array('q', [-1]) * grow)
+            self.size.extend(array('q', [0]) * grow)
+        if self.parent[x] < 0:
+            self.parent[x] = x
+            self.size[x] = 1
+            self.count += 1
+
+    def find(self, x: int) -> int:
+        """
+        Return the representative of the set containing x
+        """
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]  # path halving
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> bool:
+        """
+        Merge the sets containing a and b, return False if they were already the same set
+        """
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return False
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        self.count -= 1
+        return True
+
 
 class UndirectedGraph:
     """
@@ -42,14 +144,338 @@ class UndirectedGraph:
 
     # ------------------------------------------------------------------ #
 
+    _sorted_cache = None  # vertex id -> its neighbor ids in alphabetical order of name, dropped when its edges change
+    _components = None  # _DisjointSet of the connected components, None when it has to be rebuilt
+    _edge_count = 0  # number of edges, kept by add_edge and remove_edge
+    _shared = False  # True while a snapshot shares the vertex tables, see snapshot()
+    _generation = 0  # edit counter, see generation
+    _copied = None  # ids whose rows were copied since the last snapshot, None when no row is shared
+    split_check_budget = 1024  # vertices remove_edge may search to prove an edge removal kept its component whole
+    row_scan_limit = 16  # neighbor rows longer than this become ordered dicts instead of arrays that are scanned
+
+    @property
+    def adj_list(self) -> Mapping:
+        """
+        Return a read-only view of the adjacency as {vertex: [neighbors]}. Vertex names are interned: _ids maps each
+        name to a dense integer id (in insertion order of the vertices), _names maps ids back, and _adj holds the
+        neighbors of each id in insertion order: an int64 array while the row is at most row_scan_limit long, and a
+        dict used as an ordered set once it grows past it, so finding or deleting a neighbor is O(1) for any degree.
+        Names are only looked up at the API boundary
+        """
+        return _AdjacencyView(self)
+
+    @adj_list.setter
+    def adj_list(self, adjacency: dict) -> None:
+        """
+        Replace the graph with the given {vertex: neighbors} adjacency, which __init__ uses to start from an empty dict
+        """
+        self._ids = dict()
+        self._names = []  # None for the ids of removed vertices, which wait in _free to be reused
+        self._free = []
+        self._adj = []  # None for a row still read from the snapshot columns in _base, see load()
+        self._base = None
+        self._row_sets = dict()  # id -> set of its neighbor ids, for long rows still read from _base
+        self._sorted_cache = None
+        self._components = None
+        self._edge_count = 0
+        self._shared = False
+        self._copied = None
+        self._generation += 1
+        for v in adjacency:
+            self.add_vertex(v)
+        for v, neighbors in adjacency.items():
+            for u in neighbors:
+                self.add_edge(v, u)
+
+    def _intern(self, v: str) -> int:
+        """
+        Return the id of a new vertex v with no edges, reusing the id of a removed vertex when there is one
+        """
+        if len(self._free) > 0:
+            i = self._free.pop()
+            self._names[i] = v
+            self._adj[i] = array('q')
+        else:
+            i = len(self._names)
+            self._names.append(v)
+            self._adj.append(array('q'))
+        self._ids[v] = i
+        return i
+
+    def _row(self, i: int):
+        """
+        Return the neighbor ids of vertex i in insertion order: its own array or dict, or a view into the snapshot
+        """
+        row = self._adj[i]
+        if row is None:
+            offsets, targets = self._base
+            return targets[offsets[i]:offsets[i + 1]]
+        return row
+
+    def _owned(self, i: int):
+        """
+        Return the neighbor row of vertex i ready to be edited, first copying a row read from a snapshot file, or a
+        row still shared with a snapshot(), into one of its own
+        """
+        row = self._adj[i]
+        if row is None or self._copied is not None and i not in self._copied:
+            row = self._row(i)
+            if isinstance(row, dict):
+                row = dict(row)
+            elif len(row) > self.row_scan_limit:
+                row = dict.fromkeys(row)
+            else:
+                row = array('q', row)
+            self._adj[i] = row
+            self._row_sets.pop(i, None)
+            if self._copied is not None:
+                self._copied.add(i)
+        return row
+
+    def _writable(self) -> None:
+        """
+        Prepare the graph for an edit. The first edit after snapshot() copies the vertex tables (the rows themselves
+        are copied by _owned() as they are edited), leaving the ones the snapshot holds untouched
+        """
+        self._generation += 1
+        if self._shared:
+            self._ids = dict(self._ids)
+            self._names = list(self._names)
+            self._free = list(self._free)
+            self._adj = list(self._adj)
+            self._copied = set()
+            self._shared = False
+
+    def snapshot(self):
+        """
+        Return a read-only copy of the graph in O(1). The snapshot shares the vertex tables and rows with the graph,
+        which copies them as it edits them afterwards, so the snapshot never changes. Any number of threads can query
+        a snapshot while the graph keeps being edited, and a snapshot is freed as soon as the last reference to it is
+        dropped
+        """
+        frozen = FrozenUndirectedGraph()
+        frozen._ids, frozen._names, frozen._free = self._ids, self._names, self._free
+        frozen._adj, frozen._base = self._adj, self._base
+        frozen._edge_count = self._edge_count
+        frozen._generation = self._generation
+        self._shared = True
+        return frozen
+
+    def _has_neighbor(self, i: int, j: int) -> bool:
+        """
+        Return True if j is a neighbor of i. Short arrays are scanned and dict rows are hashed. A long row still read
+        from the snapshot columns gets a set the first time it is asked
+        """
+        row = self._row(i)
+        if self._adj[i] is not None or len(row) <= self.row_scan_limit:
+            return j in row
+        members = self._row_sets.get(i)
+        if members is None:
+            members = self._row_sets[i] = set(row)
+        return j in members
+
+    def _link(self, i: int, j: int) -> None:
+        """
+        Append j to the neighbors of i, turning the row into a dict once it grows past row_scan_limit
+        """
+        row = self._owned(i)
+        if isinstance(row, dict):
+            row[j] = None
+        elif len(row) < self.row_scan_limit:
+            row.append(j)
+        else:
+            row = self._adj[i] = dict.fromkeys(row)
+            row[j] = None
+
+    def _unlink(self, i: int, j: int) -> None:
+        """
+        Remove j from the neighbors of i, in O(1) for a dict row and in at most row_scan_limit steps for an array
+        """
+        row = self._owned(i)
+        if isinstance(row, dict):
+            del row[j]
+        else:
+            row.remove(j)
+
+    def _sorted_neighbors(self, i: int) -> []:
+        """
+        Return the neighbor ids of vertex i in alphabetical order of their names, sorting them only when the edges of
+        i changed since the last call. The returned list is shared, do not modify it
+        """
+        if self._sorted_cache is None:
+            self._sorted_cache = dict()
+        neighbors = self._sorted_cache.get(i)
+        if neighbors is None:
+            neighbors = self._sorted_cache[i] = sorted(self._row(i), key=self._names.__getitem__)
+        return neighbors
+
+    def _edges_changed(self, *vertices) -> None:
+        """
+        Drop the cached sorted neighbors of the given vertex ids after their edges changed
+        """
+        if self._sorted_cache is not None:
+            for i in vertices:
+                self._sorted_cache.pop(i, None)
+
+    @classmethod
+    def from_edge_stream(cls, edges):
+        """
+        Build a graph from any iterable of (u, v) pairs, including a generator, with the same result as
+        UndirectedGraph(list(edges)). Names are interned and the rows filled directly, with no cache or component
+        bookkeeping per edge
+        """
+        graph = cls()
+        ids, adj, limit = graph._ids, graph._adj, graph.row_scan_limit
+        count = 0
+        for u, v in edges:
+            if u == v:
+                continue
+            i = ids.get(u)
+            if i is None:
+                i = graph._intern(u)
+            j = ids.get(v)
+            if j is None:
+                j = graph._intern(v)
+            row = adj[i]
+            if len(row) < limit:  # a fresh graph only has membership sets for rows past the limit
+                if j in row:
+                    continue
+                row.append(j)
+            elif graph._has_neighbor(i, j):
+                continue
+            else:
+                graph._link(i, j)
+            if len(adj[j]) < limit:
+                adj[j].append(i)
+            else:
+                graph._link(j, i)
+            count += 1
+        graph._edge_count = count
+        return graph
+
+    @classmethod
+    def from_file(cls, path: str, fmt=None, header=None):
+        """
+        Build a graph from an edge file. fmt is 'csv', 'tsv' (whitespace separated) or 'binary' (see
+        graph_io.write_edge_file) and is guessed from the suffix when omitted. Text lines are 'u,v', binary files use
+        their name table for vertex names, or the decimal vertex ids when they have none. header says whether the
+        first line of a text file is a header (guessed when None, see graph_io.iter_text_edges). With numpy, a binary
+        file is turned into rows with array operations instead of one edge at a time
+        """
+        fmt = edge_format(path, fmt)
+        if fmt != 'binary':
+            return cls.from_edge_stream(iter_text_edges(path, fmt, weighted=False, numeric=False, header=header))
+        sources, destinations, _, names = read_edge_columns(path)
+        if np is not None:
+            return cls._from_columns(sources, destinations, names)
+        label = str if names is None else names.__getitem__
+        return cls.from_edge_stream(zip(map(label, sources), map(label, destinations)))
+
+    @classmethod
+    def _from_columns(cls, sources, destinations, names):
+        """
+        numpy version of from_edge_stream() for the columns of a binary edge file, with the same result: vertices are
+        interned in order of first appearance, loops are skipped, a repeated pair keeps its first position, and every
+        row lists its neighbors in edge order. The rows become snapshot columns in _base, as load() sets them up
+        """
+        src = np.asarray(sources, dtype=np.int64)
+        dst = np.asarray(destinations, dtype=np.int64)
+        if names is not None:  # vertex ids of the same name are one vertex
+            first = dict()
+            canonical = np.array([first.setdefault(name, i) for i, name in enumerate(names)], dtype=np.int64)
+            src, dst = canonical[src], canonical[dst]
+        keep = src != dst
+        ends = np.stack((src[keep], dst[keep]), axis=1).ravel()  # u0, v0, u1, v1, ... in the order they are read
+        found, inverse, first = _first_seen(ends)
+        order = np.argsort(first)  # the vertices in order of first appearance
+        rank = np.empty(len(found), dtype=np.int64)
+        rank[order] = np.arange(len(found))
+        ends = rank[inverse].reshape(-1, 2)
+        count = len(found)
+        _, _, first = _first_seen(ends.min(axis=1) * count + ends.max(axis=1))
+        ends = ends[np.sort(first)]  # one copy of each pair, at its first position
+        owners = ends.ravel()  # each edge appends to the row of u and then to the row of v
+        neighbors = ends[:, ::-1].ravel()
+        by_owner = np.argsort(owners * len(owners) + np.arange(len(owners)))  # a stable sort, but faster
+        offsets = array('q')
+        offsets.frombytes(np.concatenate(([0], np.cumsum(np.bincount(owners, minlength=count)))).astype(np.int64)
+                          .tobytes())
+        targets = array('q')
+        targets.frombytes(neighbors[by_owner].astype(np.int64).tobytes())
+        label = str if names is None else names.__getitem__
+        graph = cls()
+        graph._names = [label(v) for v in found[order].tolist()]
+        graph._ids = {graph._names[i]: i for i in range(count)}
+        graph._adj = [None] * count
+        graph._base = offsets, targets
+        graph._edge_count = len(ends)
+        return graph
+
+    snapshot_magic = b'UGSN'
+    snapshot_version = 1
+    snapshot_header = '<4sIqq'  # magic, version, vertices, adjacency entries (twice the edges)
+
+    def save(self, path: str) -> None:
+        """
+        Write a snapshot of the graph: a versioned header, the vertex name table, then the CSR offsets and neighbor
+        ids as 8 byte aligned columns. Ids are renumbered in vertex order (closing the gaps left by removed vertices)
+        and rows keep their insertion order, so the loaded graph prints the same. The name table stores text, so every
+        vertex name must be a str (TypeError otherwise, before anything is written)
+        """
+        for name in self._ids:
+            if not isinstance(name, str):
+                raise TypeError(f'save() needs str vertex names, got {name!r}')
+        position = array('q', [-1]) * len(self._names)
+        for k, i in enumerate(self._ids.values()):
+            position[i] = k
+        offsets = array('q', [0])
+        targets = array('q')
+        for i in self._ids.values():
+            targets.extend(map(position.__getitem__, self._row(i)))
+            offsets.append(len(targets))
+        header = struct.pack(self.snapshot_header, self.snapshot_magic, self.snapshot_version, len(self._ids),
+                             len(targets))
+        table = name_table(list(self._ids))
+        with atomic_write(path) as f:
+            f.write(header + padding(len(header)) + table + padding(len(table)))
+            f.write(offsets)
+            f.write(targets)
+
+    @classmethod
+    def load(cls, path: str, mmap=True):
+        """
+        Build a graph from a file written by save(). The snapshot columns become the id rows as they are: with mmap
+        (the default) the file is memory mapped, so loading does no per-edge work and processes loading the same file
+        share its pages, and a vertex gets its own row the first time its edges change. With mmap False the columns
+        are copied into memory
+        """
+        buffer = open_buffer(path, mmap)
+        magic, version, count, entries = struct.unpack_from(cls.snapshot_header, buffer, 0)
+        if magic != cls.snapshot_magic or version != cls.snapshot_version:
+            raise ValueError(f'{path} is not a version {cls.snapshot_version} UndirectedGraph snapshot')
+        offset = struct.calcsize(cls.snapshot_header)
+        names, offset = read_name_table(buffer, offset + -offset % 8)
+        offsets, offset = take_column(buffer, offset, 'q', count + 1, not mmap)
+        targets, offset = take_column(buffer, offset, 'q', entries, not mmap)
+        graph = cls()
+        graph._names = names
+        graph._ids = {names[i]: i for i in range(count)}
+        graph._adj = [None] * count
+        graph._base = offsets, targets
+        graph._edge_count = entries // 2
+        return graph
+
     def add_vertex(self, v: str) -> None:
         """
         Add new vertex to the graph
         """
-        if v in self.adj_list:
+        if v in self._ids:
             return
         else:
-            self.adj_list[v] = []
+            self._writable()
+            i = self._intern(v)
+            if self._components is not None:
+                self._components.add(i)
 
     def add_edge(self, u: str, v: str) -> None:
         """
@@ -57,92 +483,144 @@ class UndirectedGraph:
         """
         if u == v:  # if the vertices are the same
             return
-        if u not in self.adj_list:  # check if the key u exists, if not, create it
+        if u not in self._ids:  # check if the key u exists, if not, create it
             self.add_vertex(u)
-        if v not in self.adj_list:  # check if the key v exists, if not, create it
+        if v not in self._ids:  # check if the key v exists, if not, create it
             self.add_vertex(v)
-        if v in self.adj_list[u] and u in self.adj_list[v]:  # if an edge already exists, return
+        i, j = self._ids[u], self._ids[v]
+        if self._has_neighbor(i, j):  # if an edge already exists, return
             return
         else:  # otherwise, create an edge between the vertices
-            self.adj_list[u].append(v)
-            self.adj_list[v].append(u)
-        
+            self._writable()
+            self._link(i, j)
+            self._link(j, i)
+            self._edge_count += 1
+            self._edges_changed(i, j)
+            if self._components is not None:
+                self._components.union(i, j)
 
     def remove_edge(self, v: str, u: str) -> None:
         """
         Remove edge from the graph
         """
-        if u not in self.adj_list:  # if u is not a vertex then no edge can exist
+        if u not in self._ids:  # if u is not a vertex then no edge can exist
             return
-        if v not in self.adj_list:  # if v is not a vertex then no edge can exist
+        if v not in self._ids:  # if v is not a vertex then no edge can exist
             return
-        if u not in self.adj_list[v] and v not in self.adj_list[u]:  # if an edge does not exist
-            return
-        if self.adj_list[v] is self.adj_list[u]:
+        i, j = self._ids[u], self._ids[v]
+        if i == j or not self._has_neighbor(j, i):  # if an edge does not exist
             return
         else:
-            self.adj_list[u].remove(v)
-            self.adj_list[v].remove(u)
+            self._writable()
+            self._unlink(i, j)
+            self._unlink(j, i)
+            self._edge_count -= 1
+            self._edges_changed(i, j)
+            # union-find cannot split a set, so unless u and v are still connected it is rebuilt on the next query
+            if self._components is not None and not self._still_connected(i, j):
+                self._components = None
 
     def remove_vertex(self, v: str) -> None:
         """
         Remove vertex and all connected edges
         """
-        if v not in self.adj_list:
+        if v not in self._ids:
             return
-        temp_list = []
-        for key in self.adj_list.keys():  # iterate through the dictionary and store keys as lists
-            temp_list.append(key)
-        for x in range(len(self.adj_list)):  # iterate through and remove all edges from v to other vertices
-            self.remove_edge(temp_list[x], v)
-        self.adj_list.pop(v, None)  # remove v
-
-
+        self._writable()
+        self._components = None  # v has to leave its set, and its neighbors may split apart
+        i = self._ids[v]
+        row = self._row(i)
+        for j in row:  # only the neighbors of v have an edge to remove, the row of v is dropped as a whole below
+            self._unlink(j, i)
+        self._edge_count -= len(row)
+        self._edges_changed(*row)
+        del self._ids[v]  # remove v, its id is free for the next new vertex
+        self._names[i] = None
+        self._adj[i] = array('q')
+        self._row_sets.pop(i, None)
+        self._free.append(i)
+        self._edges_changed(i)
 
     def get_vertices(self) -> []:
         """
         Return list of vertices in the graph (any order)
         """
-        temp_list = []
-        for key in self.adj_list.keys():  # iterate through the dictionary and store keys as lists
-            temp_list.append(key)
-        return temp_list
+        return list(self._ids)
 
     def get_edges(self) -> []:
         """
         Return list of edges in the graph (any order)
         """
-        temp_list = []
-        edge_list = []
-        for key, value in self.adj_list.items():  # iterate through the dictionary and store keys as lists
-            for x in range (len(self.adj_list[key])):
-                temp = [key, self.adj_list[key][x]]
-                if temp not in temp_list and temp.reverse() not in temp_list:
-                    temp_list.append(temp)
-        for x in range(len(temp_list)):
-            edge_list.append(tuple(temp_list[x]))
-        return edge_list
-        
+        return list(self.iter_edges())
+
+    def iter_edges(self):
+        """
+        Generator version of get_edges(), yields every edge once in O(V + E) and in the same order. An edge is
+        yielded as (neighbor, vertex) while visiting whichever of its two vertices comes first in adj_list, so the
+        other copy is skipped by checking whether the neighbor was already visited
+        """
+        names = self._names
+        visited = bytearray(len(names))
+        for key, i in self._ids.items():
+            for j in self._row(i):
+                if not visited[j]:
+                    yield names[j], key
+            visited[i] = 1
+
+    @property
+    def edge_count(self) -> int:
+        """
+        Return the number of edges, which add_edge and remove_edge keep up to date
+        """
+        return self._edge_count
+
+    @property
+    def generation(self) -> int:
+        """
+        Return a counter that grows with every edit of the graph, so a caller can tell whether a snapshot() it took
+        earlier still matches the graph
+        """
+        return self._generation
+
 
     def is_valid_path(self, path: []) -> bool:
         """
-        Return true if provided path is valid, False otherwise
+        Return true if provided path is valid, False otherwise (also when it names a vertex that is not in the graph)
         """
-        stack = deque()
-        for x in range(len(path)-1, -1, -1):
-            stack.append(path[x])
-        if len(stack) == 1:
-            temp = stack.pop()
-            if temp not in self.adj_list:
-                return False
-        while len(stack) > 1:
-            reachable = set()
-            temp = stack.pop()
-            for i in range (len(self.adj_list[temp])):
-                reachable.add(self.adj_list[temp][i])
-            if stack[len(stack) - 1] not in reachable:  # if the next vertex is not reachable
-                return False
-        return True
+        return self._first_invalid_hop(path) < 0
+
+    def validate_paths(self, paths) -> ():
+        """
+        Check every path of an iterable (read one at a time, so it can be a generator streaming a log) like
+        is_valid_path(). Return (valid, first_invalid) with one entry per path: a bytearray of 1 / 0 flags and an
+        array with the index i of the first hop path[i] -> path[i + 1] that is not an edge (0 when the only vertex is
+        not in the graph), -1 for a valid path
+        """
+        valid = bytearray()
+        first_invalid = array('q')
+        for path in paths:
+            hop = self._first_invalid_hop(path)
+            valid.append(hop < 0)
+            first_invalid.append(hop)
+        return valid, first_invalid
+
+    def _first_invalid_hop(self, path: []) -> int:
+        """
+        Return the index of the first hop of path that is not an edge, or -1 if there is none. Each hop is one id
+        lookup and one membership test in the neighbor row of the previous vertex
+        """
+        ids = self._ids
+        if len(path) == 0:
+            return -1
+        i = ids.get(path[0])
+        if i is None:
+            return 0
+        for x in range(len(path) - 1):
+            j = ids.get(path[x + 1])
+            if j is None or not self._has_neighbor(i, j):  # if the next vertex is not reachable
+                return x
+            i = j
+        return -1
 
        
 
@@ -151,113 +629,175 @@ class UndirectedGraph:
         Return list of vertices visited during DFS search
         Vertices are picked in alphabetical order
         """
-        if v_start not in self.adj_list:
-            return []
-        if v_end is not None and v_end not in self.adj_list:
-            v_end = None
-        visited_vertices = []
-        stack = deque(v_start)
+        return list(self.iter_dfs(v_start, v_end))
+
+    def iter_dfs(self, v_start, v_end=None):
+        """
+        Generator version of dfs(), yields the vertices one at a time in the same order so the caller can stop early.
+        The search runs on vertex ids with a visited bitmap
+        """
+        if v_start not in self._ids:
+            return
+        names = self._names
+        visited = bytearray(len(names))
+        stack = [self._ids[v_start]]
         while len(stack) > 0:
             temp = stack.pop()
-            temp_list = []  # used to add vertices in reverse lexicographocal order
-            if temp not in visited_vertices:
-                visited_vertices.append(temp)
-            if temp == v_end:
-                break
-            for x in range(len(self.adj_list[temp])):  # iterate through reachable vertices
-                temp_list.append(self.adj_list[temp][x])
-                temp_list.sort(reverse=True)  # creates a descending order list of reachable vertices
-            for x in range(len(temp_list)):
-                if temp_list[x] not in visited_vertices:
-                    stack.append(temp_list[x])  # append vertcies to stack so they are visited in ascending lexicographical order
-        return visited_vertices
-
-
+            if visited[temp]:  # reached again through another vertex before it was popped
+                continue
+            visited[temp] = 1
+            yield names[temp]
+            if names[temp] == v_end:
+                return
+            for x in reversed(self._sorted_neighbors(temp)):  # push in reverse so they are visited alphabetically
+                if not visited[x]:
+                    stack.append(x)
 
     def bfs(self, v_start, v_end=None) -> []:
         """
         Return list of vertices visited during BFS search
         Vertices are picked in alphabetical order
         """
-        if v_start not in self.adj_list:
-            return []
-        if v_end is not None and v_end not in self.adj_list:
-            v_end = None
-        visited_vertices = []
-        queue = deque(v_start)
+        return list(self.iter_bfs(v_start, v_end))
+
+    def iter_bfs(self, v_start, v_end=None):
+        """
+        Generator version of bfs(), yields the vertices one at a time in the same order so the caller can stop early.
+        The search runs on vertex ids, and a vertex is marked in the bitmap when it is queued so no queue membership
+        scans are needed
+        """
+        if v_start not in self._ids:
+            return
+        names = self._names
+        start = self._ids[v_start]
+        seen = bytearray(len(names))
+        seen[start] = 1
+        queue = deque([start])
         while len(queue) > 0:
-            temp = queue.pop()
-            temp_list = []  # used to add vertices in lexicographocal order
-            visited_vertices.append(temp)
-            if temp == v_end:
-                break
-            for x in range(len(self.adj_list[temp])):  # iterate through reachable vertices
-                if self.adj_list[temp][x] not in visited_vertices:
-                    temp_list.append(self.adj_list[temp][x])
-            temp_list.sort()  # creates a ascending list of reachable vertices
-            for x in range(len(temp_list)):
-                # if not visited yet and not already in queue for bfs
-                if temp_list[x] not in visited_vertices and temp_list[x] not in queue:
-                    # append vertcies to stack so they are visited in ascending lexicographical order
-                    queue.appendleft(temp_list[x])
-        return visited_vertices
+            temp = queue.popleft()
+            yield names[temp]
+            if names[temp] == v_end:
+                return
+            for x in self._sorted_neighbors(temp):  # cached in alphabetical order
+                if not seen[x]:
+                    seen[x] = 1
+                    queue.append(x)
+
+    def bfs_levels(self, v_start, direction='auto', workers=None) -> ():
+        """
+        Return (hops, parents) dicts for the vertices reachable from v_start: the number of edges on a shortest path
+        from v_start and the vertex each one was reached from (None for v_start). The search is level-synchronous over
+        the vertex ids, see graph_bfs.level_bfs() for direction and workers
+        """
+        if v_start not in self._ids:
+            return dict(), dict()
+        names = self._names
+        offsets, targets = array('q', [0]), array('q')
+        for i in range(len(names)):
+            if names[i] is not None:  # the ids of removed vertices get empty rows
+                targets.extend(self._sorted_neighbors(i))  # sorted rows, which bottom-up steps rely on
+            offsets.append(len(targets))
+        hops, parents = level_bfs(len(names), (offsets, targets), lambda: (offsets, targets), self._ids[v_start],
+                                  direction, workers)
+        reached = [(v, i) for v, i in self._ids.items() if hops[i] >= 0]
+        return ({v: hops[i] for v, i in reached},
+                {v: names[parents[i]] if parents[i] >= 0 else None for v, i in reached})
 
     def count_connected_components(self):
         """
         Return number of connected componets in the graph
         """
-        unvisited_vertices = self.get_vertices()
-        connected_components = 0
-        while len(unvisited_vertices) > 0:
-            visited_vertices = self.dfs(unvisited_vertices[0])
-            for x in range(len(visited_vertices)):
-                unvisited_vertices.remove(visited_vertices[x])
-            connected_components += 1
-        return connected_components
+        return self._connectivity().count
 
+    def same_component(self, u: str, v: str) -> bool:
+        """
+        Return True if u and v are vertices in the same connected component, False otherwise
+        """
+        if u not in self._ids or v not in self._ids:
+            return False
+        components = self._connectivity()
+        return components.find(self._ids[u]) == components.find(self._ids[v])
+
+    def component_of(self, v: str):
+        """
+        Return a representative vertex of the connected component containing v (the same vertex for every member
+        until the graph changes), or None if v is not in the graph
+        """
+        if v not in self._ids:
+            return None
+        return self._names[self._connectivity().find(self._ids[v])]
+
+    def _connectivity(self) -> _DisjointSet:
+        """
+        Return the union-find of the connected components, rebuilding it in O(V + E) if an edit invalidated it. Edge
+        insertions are merged into it as they happen
+        """
+        if self._components is None:
+            components = _DisjointSet()
+            for i in self._ids.values():
+                components.add(i)
+            for i in self._ids.values():
+                for j in self._row(i):
+                    components.union(i, j)
+            self._components = components
+        return self._components
+
+    def _still_connected(self, u: int, v: int) -> bool:
+        """
+        Run a breadth first search from vertex id u and from v in lockstep and return True if they meet before either
+        side has seen split_check_budget vertices. False means the component may have split
+        """
+        seen = ({u}, {v})
+        queues = (deque([u]), deque([v]))
+        while len(queues[0]) > 0 and len(queues[1]) > 0:
+            if len(seen[0]) + len(seen[1]) > 2 * self.split_check_budget:
+                return False
+            side = 0 if len(seen[0]) <= len(seen[1]) else 1  # grow the smaller search
+            for x in self._row(queues[side].popleft()):
+                if x in seen[1 - side]:
+                    return True
+                if x not in seen[side]:
+                    seen[side].add(x)
+                    queues[side].append(x)
+        return False
 
     def has_cycle(self):
         """
         Return True if graph contains a cycle, False otherwise
+        A forest with C trees on V vertices has exactly V - C edges, so any extra edge closes a cycle. With the
+        maintained components this is O(1) after edge insertions
         """
-        unsearched_vertices = self.get_vertices()  # creates a list of all vertices
-        parent = dict()
-        for i in range(len(unsearched_vertices)):  # creates a dictionary to store the parent values of vertices
-            parent[unsearched_vertices[i]] = None
-        while len(unsearched_vertices) > 0:  # perform a DFS on each vertex using helper method
-            has_cycle = self.has_cycle_helper(unsearched_vertices[0], parent)  # store the true or false value
-            if has_cycle is True:  # if a cycle exists, break
-                return True
-            unsearched_vertices.remove(unsearched_vertices[0])  # if a cycle doesn't exist, remove vertex and continue
-        return False  # no cycles exist
+        return self._edge_count > len(self._ids) - self.count_connected_components()
+
+    def would_create_cycle(self, u: str, v: str) -> bool:
+        """
+        Return True if adding the edge u-v would close a new cycle, which is when u and v are already connected by
+        another path. Checking each edge of a stream before add_edge() validates it one edge at a time
+        """
+        if u == v or u not in self._ids or v not in self._ids or self._has_neighbor(self._ids[u], self._ids[v]):
+            return False
+        return self.same_component(u, v)
+
 
+class FrozenUndirectedGraph(UndirectedGraph):
+    """
+    Read-only UndirectedGraph returned by UndirectedGraph.snapshot(). Every query works as on the graph it was taken
+    from, the mutating methods raise TypeError
+    """
 
-    def has_cycle_helper(self, v, parent):
+    def _read_only(self, *args, **kwargs):
         """
-        Helper method that takes a vertex, and the list of parent vertices, does a DFS starting from v and returns true
-        if a cycle exists from v
+        Stand in for every method that would edit the graph
         """
-        visited_vertices = []
-        stack = deque(v)
-        while len(stack) > 0:
-            temp = stack.pop()
-            temp_list = []  # used to add vertices in reverse lexicographocal order
-            if temp not in visited_vertices:
-                visited_vertices.append(temp)
-            for x in range(len(self.adj_list[temp])):  # iterate through reachable vertices
-                temp_list.append(self.adj_list[temp][x])
-                temp_list.sort(reverse=True)  # creates a descending order list of reachable vertices
-            for x in range(len(temp_list)):
-                if temp_list[x] not in visited_vertices and temp_list[x] not in stack:
-                    # append vertices to stack so they are visited in ascending lexicographical order
-                    stack.append(temp_list[x])
-                    parent[temp_list[x]] = temp  # update parent values for the vertices we just added
-                    # if a vertex was visited and it's not the parent vertex, then a cycle must exist, return True
-                if temp_list[x] in visited_vertices and temp_list[x] != parent[temp]:
-                    return True
-        return False  # cycle does not exist from v
+        raise TypeError('graph snapshots are read-only')
+
+    add_vertex = add_edge = remove_edge = remove_vertex = _read_only
 
-   
+    def snapshot(self):
+        """
+        Return the snapshot itself, which already never changes
+        """
+        return self
 
 
 if __name__ == '__main__':